@@ -42,6 +42,7 @@ from .py import manager
 from .py import download
 from .py import information
 from .py import upload
+from .py import progress
 
 routes = config.routes
 
@@ -49,6 +50,7 @@ manager.ModelManager().add_routes(routes)
 download.ModelDownload().add_routes(routes)
 information.Information().add_routes(routes)
 upload.ModelUploader().add_routes(routes)
+progress.broadcaster.add_routes(routes)
 
 
 WEB_DIRECTORY = "web"
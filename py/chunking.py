@@ -0,0 +1,36 @@
+"""
+Read response bodies in chunks adapted to the throughput.
+
+This module must not import anything of ComfyUI or of the model manager,
+it is shared by the downloads and `scripts/bench_download.py`.
+"""
+
+import time
+
+
+async def iter_adaptive_chunks(
+    content,
+    min_chunk_size: int = 64 * 1024,
+    max_chunk_size: int = 8 * 1024 * 1024,
+    target_duration: float = 0.05,
+):
+    """
+    Read the aiohttp stream `content` in chunks that double while they are
+    read faster than half of `target_duration` and halve when they take
+    more than twice as long. A fast connection is read in a few large
+    chunks instead of many small ones, a slow connection still yields often
+    enough to report progress.
+    """
+    chunk_size = min_chunk_size
+    while True:
+        started = time.monotonic()
+        chunk = await content.read(chunk_size)
+        if not chunk:
+            break
+        elapsed = time.monotonic() - started
+        yield chunk
+
+        if len(chunk) == chunk_size and elapsed < target_duration / 2:
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+        elif elapsed > target_duration * 2:
+            chunk_size = max(chunk_size // 2, min_chunk_size)
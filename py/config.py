@@ -10,12 +10,20 @@ setting_key = {
     },
     "download": {
         "max_task_count": "ModelManager.Download.MaxTaskCount",
+        "max_bandwidth": "ModelManager.Download.MaxBandwidth",
+        "task_bandwidth": "ModelManager.Download.TaskBandwidth",
+        "bandwidth_schedule": "ModelManager.Download.BandwidthSchedule",
     },
     "scan": {
-        "include_hidden_files": "ModelManager.Scan.IncludeHiddenFiles"
+        "include_hidden_files": "ModelManager.Scan.IncludeHiddenFiles",
+        "api_concurrency": "ModelManager.Scan.ApiConcurrency",
+        "api_rate_limit": "ModelManager.Scan.ApiRateLimit",
     },
 }
 
+# Seconds the progress events are coalesced before they are sent to the frontend.
+progress_interval = 0.5
+
 user_agent = "Mozilla/5.0 (iPad; CPU OS 12_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148"
 
 
@@ -1,8 +1,11 @@
 import os
+import json
 import uuid
 import time
-import requests
+import math
 import base64
+import asyncio
+import threading
 
 
 import folder_paths
@@ -16,6 +19,10 @@ from aiohttp import web
 from . import config
 from . import utils
 from . import thread
+from . import chunking
+from . import hashing
+from . import progress
+from . import watcher
 
 
 @dataclass
@@ -31,6 +38,7 @@ class TaskStatus:
     progress: float = 0
     bps: float = 0
     error: Optional[str] = None
+    priority: int = 0
 
     def __init__(self, **kwargs):
         self.taskId = kwargs.get("taskId", None)
@@ -44,6 +52,7 @@ class TaskStatus:
         self.progress = kwargs.get("progress", 0)
         self.bps = kwargs.get("bps", 0)
         self.error = kwargs.get("error", None)
+        self.priority = kwargs.get("priority", 0)
 
     def to_dict(self):
         return {
@@ -58,6 +67,7 @@ class TaskStatus:
             "progress": self.progress,
             "bps": self.bps,
             "error": self.error,
+            "priority": self.priority,
         }
 
 
@@ -71,6 +81,8 @@ class TaskContent:
     downloadUrl: str
     sizeBytes: float
     hashes: Optional[dict[str, str]] = None
+    segments: Optional[list[list[int]]] = None
+    priority: int = 0
 
     def __init__(self, **kwargs):
         self.type = kwargs.get("type", None)
@@ -80,7 +92,12 @@ class TaskContent:
         self.downloadPlatform = kwargs.get("downloadPlatform", None)
         self.downloadUrl = kwargs.get("downloadUrl", None)
         self.sizeBytes = float(kwargs.get("sizeBytes", 0))
-        self.hashes = kwargs.get("hashes", None)
+        hashes = kwargs.get("hashes", None)
+        # The create task form posts the hashes as a JSON string.
+        self.hashes = json.loads(hashes) if isinstance(hashes, str) and hashes else hashes
+        # [start, end, downloaded] of every byte range of a segmented download.
+        self.segments = kwargs.get("segments", None)
+        self.priority = int(kwargs.get("priority", 0) or 0)
 
     def to_dict(self):
         return {
@@ -92,6 +109,8 @@ class TaskContent:
             "downloadUrl": self.downloadUrl,
             "sizeBytes": self.sizeBytes,
             "hashes": self.hashes,
+            "segments": self.segments,
+            "priority": self.priority,
         }
 
 
@@ -122,6 +141,13 @@ class ApiKey:
                 result[key] = v[:4] + "****" + v[-4:]
         return result
 
+    def load(self):
+        """
+        Load the stored keys without a request, for the downloads resumed on start.
+        """
+        if os.path.exists(self.__cache_file):
+            self.__store = utils.load_dict_pickle_file(self.__cache_file)
+
     def get_value(self, key: str):
         return self.__store.get(key, None)
 
@@ -133,9 +159,161 @@ class ApiKey:
         utils.save_dict_pickle_file(self.__cache_file, self.__store)
 
 
+class DownloadQueue:
+    """
+    Persistent order of the download tasks, the first waiting task runs next.
+
+    Also remembers which tasks are queued (running or waiting), so they can
+    be resumed when the server restarts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._order: list[str] = []
+        self._queued: set[str] = set()
+
+    def _get_queue_file(self):
+        return utils.join_path(utils.get_download_path(), "queue.pkl")
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        queue_file = self._get_queue_file()
+        if os.path.isfile(queue_file):
+            data = utils.load_dict_pickle_file(queue_file)
+            self._order = list(data.get("order", []))
+            self._queued = set(data.get("queued", []))
+
+    def _save(self):
+        data = {"order": self._order, "queued": [task_id for task_id in self._order if task_id in self._queued]}
+        utils.save_dict_pickle_file(self._get_queue_file(), data)
+
+    def add(self, task_id: str):
+        with self._lock:
+            self._load()
+            if task_id not in self._order:
+                self._order.append(task_id)
+                self._save()
+
+    def remove(self, task_id: str):
+        with self._lock:
+            self._load()
+            if task_id in self._order:
+                self._order.remove(task_id)
+            self._queued.discard(task_id)
+            self._save()
+
+    def set_queued(self, task_id: str, queued: bool):
+        with self._lock:
+            self._load()
+            if task_id not in self._order:
+                self._order.append(task_id)
+            if queued:
+                self._queued.add(task_id)
+            else:
+                self._queued.discard(task_id)
+            self._save()
+
+    def get_queued(self):
+        with self._lock:
+            self._load()
+            return [task_id for task_id in self._order if task_id in self._queued]
+
+    def get_order(self):
+        with self._lock:
+            self._load()
+            return list(self._order)
+
+    def index(self, task_id: str):
+        with self._lock:
+            self._load()
+            try:
+                return self._order.index(task_id)
+            except ValueError:
+                return len(self._order)
+
+    def sort(self, task_ids: list[str]):
+        """
+        Sort the tasks in queue order, unknown tasks are appended to the queue.
+        """
+        with self._lock:
+            self._load()
+            unknown = [task_id for task_id in task_ids if task_id not in self._order]
+            if unknown:
+                self._order.extend(unknown)
+                self._save()
+            order = {task_id: index for index, task_id in enumerate(self._order)}
+            return sorted(task_ids, key=lambda task_id: order[task_id])
+
+    def move(self, task_id: str, action: Literal["up", "down", "pin"]):
+        with self._lock:
+            self._load()
+            if task_id not in self._order:
+                self._order.append(task_id)
+            index = self._order.index(task_id)
+            if action == "up":
+                new_index = max(index - 1, 0)
+            elif action == "down":
+                new_index = min(index + 1, len(self._order) - 1)
+            elif action == "pin":
+                new_index = 0
+            else:
+                raise RuntimeError(f"Invalid action: {action}")
+            self._order.insert(new_index, self._order.pop(index))
+            self._save()
+            return list(self._order)
+
+
+class BufferWriter:
+    """
+    Write (and hash) the buffers of a download in the default executor, so
+    the large writes and the hashing do not block the download loop shared
+    by all tasks. The buffers are written one at a time and in order, the
+    next buffer is read while the previous one is written.
+    """
+
+    def __init__(self, file, hasher: Optional[hashing.StreamHasher] = None, on_written: Optional[Callable[[int], None]] = None):
+        self.file = file
+        self.hasher = hasher
+        # Called on the loop with the size of every written buffer.
+        self.on_written = on_written
+        self._pending: Optional[asyncio.Future] = None
+
+    def _write(self, data: bytearray):
+        self.file.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        return len(data)
+
+    async def write(self, data: bytearray):
+        """
+        Wait for the previous buffer, then start writing this one. The buffer
+        must not be modified afterwards.
+        """
+        await self.flush()
+        if data:
+            loop = asyncio.get_running_loop()
+            self._pending = loop.run_in_executor(None, self._write, data)
+
+    async def flush(self):
+        if self._pending is None:
+            return
+        # A cancelled task still waits for its write, its size is recorded on the next flush.
+        size = await asyncio.shield(self._pending)
+        self._pending = None
+        if self.on_written is not None:
+            self.on_written(size)
+
+
 class ModelDownload:
     def __init__(self):
         self.api_key = ApiKey()
+        self.download_queue = DownloadQueue()
+        self.download_engine.order_key = self.download_queue.index
+        # Continue the queued downloads once the server is running.
+        asyncio.run_coroutine_threadsafe(self.resume_download_queue(), config.serverInstance.loop)
 
     def add_routes(self, routes):
         @routes.post("/model-manager/download/init")
@@ -171,10 +349,19 @@ class ModelDownload:
                 utils.print_error(error_msg)
                 return web.json_response({"success": False, "error": error_msg})
 
+        @routes.get("/model-manager/download/metrics")
+        async def get_download_metrics(request):
+            """
+            Get the slot and queue metrics of the download engine.
+            """
+            return web.json_response({"success": True, "data": self.download_engine.metrics()})
+
         @routes.put("/model-manager/download/{task_id}")
         async def resume_download_task(request):
             """
-            Toggle download task status.
+            Toggle download task status, or set the bandwidth priority of the task.
+
+            request body: {"status": "pause" | "resume"} or {"priority": int}
             """
             try:
                 task_id = request.match_info.get("task_id", None)
@@ -186,6 +373,8 @@ class ModelDownload:
                     await self.pause_model_download_task(task_id)
                 elif status == "resume":
                     await self.download_model(task_id, request)
+                elif "priority" in json_data:
+                    await self.set_task_priority(task_id, int(json_data["priority"]))
                 else:
                     raise web.HTTPBadRequest(reason="Invalid status")
 
@@ -195,6 +384,24 @@ class ModelDownload:
                 utils.print_error(error_msg)
                 return web.json_response({"success": False, "error": error_msg})
 
+        @routes.put("/model-manager/download/{task_id}/order")
+        async def move_download_task(request):
+            """
+            Move the task in the download queue. A pinned task is moved to
+            the front and runs as soon as a download slot is free.
+
+            request body: {"action": "up" | "down" | "pin"}
+            """
+            try:
+                task_id = request.match_info.get("task_id", None)
+                json_data = await request.json()
+                await self.move_model_download_task(task_id, json_data.get("action", None), request)
+                return web.json_response({"success": True})
+            except Exception as e:
+                error_msg = f"Move download task failed: {str(e)}"
+                utils.print_error(error_msg)
+                return web.json_response({"success": False, "error": error_msg})
+
         @routes.delete("/model-manager/download/{task_id}")
         async def delete_model_download_task(request):
             """
@@ -223,6 +430,7 @@ class ModelDownload:
             - downloadPlatform: download platform.
             - downloadUrl: download url.
             - hash: a JSON string containing the hash value of the downloaded model.
+            - priority: bandwidth priority, higher is served first (optional, default 0).
             """
             task_data = await request.post()
             task_data = dict(task_data)
@@ -236,7 +444,7 @@ class ModelDownload:
 
     download_model_task_status: dict[str, TaskStatus] = {}
 
-    download_thread_pool = thread.DownloadThreadPool()
+    download_engine = thread.DownloadEngine()
 
     def set_task_content(self, task_id: str, task_content: Union[TaskContent, dict]):
         download_path = utils.get_download_path()
@@ -261,7 +469,10 @@ class ModelDownload:
             task_content = self.get_task_content(task_id)
             download_file = utils.join_path(download_path, f"{task_id}.download")
             download_size = 0
-            if os.path.exists(download_file):
+            if task_content.segments:
+                # The file of a segmented download is preallocated.
+                download_size = sum(done for start, end, done in task_content.segments)
+            elif os.path.exists(download_file):
                 download_size = os.path.getsize(download_file)
 
             total_size = task_content.sizeBytes
@@ -274,6 +485,7 @@ class ModelDownload:
                 downloadedSize=download_size,
                 totalSize=task_content.sizeBytes,
                 progress=download_size / total_size * 100 if total_size > 0 else 0,
+                priority=task_content.priority,
             )
 
             self.download_model_task_status[task_id] = task_status
@@ -282,6 +494,13 @@ class ModelDownload:
 
     def delete_task_status(self, task_id: str):
         self.download_model_task_status.pop(task_id, None)
+        progress.broadcaster.forget("update_download_task", task_id)
+
+    def report_task_status(self, task_status: TaskStatus):
+        """
+        Send the task status to the frontend, coalesced with the other progress events.
+        """
+        progress.broadcaster.publish("update_download_task", task_status.taskId, task_status.to_dict())
 
     async def scan_model_download_task_list(self):
         """
@@ -293,11 +512,10 @@ class ModelDownload:
         task_files = sorted(
             task_files,
             key=lambda x: os.stat(utils.join_path(download_dir, x)).st_ctime,
-            reverse=True,
         )
+        task_ids = self.download_queue.sort([task_file.replace(".task", "") for task_file in task_files])
         task_list: list[dict] = []
-        for task_file in task_files:
-            task_id = task_file.replace(".task", "")
+        for task_id in task_ids:
             task_status = self.get_task_status(task_id)
             task_list.append(task_status.to_dict())
 
@@ -328,6 +546,7 @@ class ModelDownload:
             preview_file = task_data.pop("previewFile", None)
             utils.save_model_preview(task_path, preview_file, download_platform)
             self.set_task_content(task_id, task_data)
+            self.download_queue.add(task_id)
             task_status = TaskStatus(
                 taskId=task_id,
                 type=model_type,
@@ -335,6 +554,7 @@ class ModelDownload:
                 preview=utils.get_model_preview_name(task_path),
                 platform=download_platform,
                 totalSize=float(task_data.get("sizeBytes", 0)),
+                priority=int(task_data.get("priority", 0) or 0),
             )
             self.download_model_task_status[task_id] = task_status
             await utils.send_json("create_download_task", task_status.to_dict())
@@ -345,20 +565,64 @@ class ModelDownload:
         await self.download_model(task_id, request)
         return task_id
 
+    async def set_task_priority(self, task_id: str, priority: int):
+        task_content = self.get_task_content(task_id)
+        task_content.priority = priority
+        self.set_task_content(task_id, task_content)
+        # A running download reads the priority from its status.
+        self.get_task_status(task_id).priority = priority
+
+    async def move_model_download_task(self, task_id: str, action: str, request=None):
+        self.get_task_content(task_id)
+        order = self.download_queue.move(task_id, action)
+        await utils.send_json("update_download_queue", order)
+        if action == "pin" and not self.download_engine.is_active(task_id):
+            await self.download_model(task_id, request)
+
+    async def resume_download_queue(self):
+        """
+        Resume the tasks that were running or waiting when the server stopped.
+        """
+        self.api_key.load()
+        download_path = utils.get_download_path()
+        for task_id in self.download_queue.get_queued():
+            try:
+                task_content = self.get_task_content(task_id)
+            except Exception:
+                self.download_queue.remove(task_id)
+                continue
+
+            # The server may have stopped after the task finished, before the queue was updated.
+            download_tmp_file = utils.join_path(download_path, f"{task_id}.download")
+            if not os.path.isfile(download_tmp_file):
+                try:
+                    model_path = utils.get_full_path(task_content.type, task_content.pathIndex, task_content.fullname)
+                except Exception:
+                    model_path = None
+                if model_path is not None and os.path.isfile(model_path):
+                    utils.print_debug(f"Skip resuming download task {task_id}, the model was already downloaded.")
+                    os.remove(utils.join_path(download_path, f"{task_id}.task"))
+                    self.download_queue.remove(task_id)
+                    continue
+
+            utils.print_debug(f"Resume download task {task_id}")
+            await self.download_model(task_id, None)
+
     async def pause_model_download_task(self, task_id: str):
         task_status = self.get_task_status(task_id=task_id)
-        task_status.status = "pause"
+        self.download_queue.set_queued(task_id, False)
+        await self.download_engine.cancel(task_id)
+        # A running task reports the pause itself, a waiting one is just dequeued.
+        if task_status.status != "pause":
+            task_status.status = "pause"
+            self.report_task_status(task_status)
 
     async def delete_model_download_task(self, task_id: str):
-        task_status = self.get_task_status(task_id)
-        is_running = task_status.status == "doing"
-        task_status.status = "waiting"
         await utils.send_json("delete_download_task", task_id)
 
-        # Pause the task
-        if is_running:
-            task_status.status = "pause"
-            time.sleep(1)
+        # Stop the task and wait until the download file is closed
+        await self.download_engine.cancel(task_id)
+        self.download_queue.remove(task_id)
 
         download_dir = utils.get_download_path()
         task_file_list = os.listdir(download_dir)
@@ -373,7 +637,7 @@ class ModelDownload:
     async def download_model(self, task_id: str, request):
         async def download_task(task_id: str):
             async def report_progress(task_status: TaskStatus):
-                await utils.send_json("update_download_task", task_status.to_dict())
+                self.report_task_status(task_status)
 
             try:
                 # When starting a task from the queue, the task may not exist
@@ -383,7 +647,7 @@ class ModelDownload:
 
             # Update task status
             task_status.status = "doing"
-            await utils.send_json("update_download_task", task_status.to_dict())
+            self.report_task_status(task_status)
 
             try:
 
@@ -408,26 +672,54 @@ class ModelDownload:
                     progress_callback=report_progress,
                     interval=progress_interval,
                 )
+            except asyncio.CancelledError:
+                # Cancelled by pause or delete, the queue was updated by them.
+                task_status.status = "pause"
+                self.report_task_status(task_status)
+                raise
             except Exception as e:
+                self.download_queue.set_queued(task_id, False)
                 task_status.status = "pause"
                 task_status.error = str(e)
+                # Errors are sent right away, a coalesced update would drop them.
                 await utils.send_json("update_download_task", task_status.to_dict())
                 task_status.error = None
+                self.report_task_status(task_status)
                 utils.print_error(str(e))
+            finally:
+                self.download_engine.bandwidth.release(task_id)
+
+        if request is not None:
+            self.apply_download_settings(request)
 
         try:
-            status = self.download_thread_pool.submit(download_task, task_id)
+            self.download_queue.set_queued(task_id, True)
+            status = self.download_engine.submit(task_id, download_task)
             if status == "Waiting":
                 task_status = self.get_task_status(task_id)
                 task_status.status = "waiting"
-                await utils.send_json("update_download_task", task_status.to_dict())
+                self.report_task_status(task_status)
         except Exception as e:
             task_status.status = "pause"
             task_status.error = str(e)
             await utils.send_json("update_download_task", task_status.to_dict())
             task_status.error = None
+            self.report_task_status(task_status)
             utils.print_error(str(e))
 
+    def apply_download_settings(self, request):
+        """
+        Apply the concurrency and bandwidth settings of the user.
+        """
+        megabyte = 1024 * 1024
+        max_task_count = utils.get_setting_value(request, "download.max_task_count", 5)
+        self.download_engine.resize(int(max_task_count or 5))
+        self.download_engine.bandwidth.configure(
+            max_bandwidth=float(utils.get_setting_value(request, "download.max_bandwidth", 0) or 0) * megabyte,
+            task_bandwidth=float(utils.get_setting_value(request, "download.task_bandwidth", 0) or 0) * megabyte,
+            schedule=utils.get_setting_value(request, "download.bandwidth_schedule", ""),
+        )
+
     async def download_model_file(
         self,
         task_id: str,
@@ -444,6 +736,16 @@ class ModelDownload:
             model_type = task_content.type
             path_index = task_content.pathIndex
             fullname = task_content.fullname
+
+            if hasher.expected:
+                # Hash what was not hashed while streaming, the ranges of a segmented download.
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, hasher.update_file, download_tmp_file)
+                mismatches = hasher.verify()
+                if mismatches:
+                    self._quarantine_download(task_id, task_content)
+                    raise RuntimeError(f"{fullname} is corrupted, {', '.join(mismatches)} does not match. The download was discarded, resume the task to download it again.")
+
             # Write description file
             description = task_content.description
             description_file = utils.join_path(download_path, f"{task_id}.md")
@@ -454,9 +756,19 @@ class ModelDownload:
 
             utils.rename_model(download_tmp_file, model_path)
 
-            time.sleep(1)
+            # The file was hashed while downloading, no need to read it again.
+            if hasher.size == total_size:
+                hashing.get_hash_cache().set(model_path, hasher.hexdigest("SHA256"))
+
+            # Send the new model to the model lists before the completion.
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, watcher.get_model_watcher().notify_changed, model_type, model_path)
+
+            await asyncio.sleep(1)
             task_file = utils.join_path(download_path, f"{task_id}.task")
             os.remove(task_file)
+            self.download_queue.remove(task_id)
+            progress.broadcaster.forget("update_download_task", task_id)
             await utils.send_json("complete_download_task", task_id)
 
         async def update_progress():
@@ -469,6 +781,9 @@ class ModelDownload:
             await progress_callback(task_status)
             last_update_time = time.time()
             last_downloaded_size = downloaded_size
+            if task_content.segments:
+                # Record which ranges are done, a resumed task only fetches the rest.
+                self.set_task_content(task_id, task_content)
 
         task_status = self.get_task_status(task_id)
         task_content = self.get_task_content(task_id)
@@ -481,13 +796,35 @@ class ModelDownload:
         download_path = utils.get_download_path()
         download_tmp_file = utils.join_path(download_path, f"{task_id}.download")
 
+        session = self.download_engine.get_session()
+
+        if task_content.segments is None and not os.path.isfile(download_tmp_file):
+            task_content.segments = await self._plan_segments(session, model_url, headers)
+            if task_content.segments is not None:
+                task_content.sizeBytes = float(task_content.segments[-1][1])
+                task_status.totalSize = task_content.sizeBytes
+                self.set_task_content(task_id, task_content)
+                self.report_task_status(task_status)
+
+        if task_content.segments and not os.path.isfile(download_tmp_file):
+            # The preallocated file is gone, nothing downloaded is left.
+            task_content.segments = [[start, end, 0] for start, end, done in task_content.segments]
+
         downloaded_size = 0
-        if os.path.isfile(download_tmp_file):
+        if task_content.segments:
+            downloaded_size = sum(done for start, end, done in task_content.segments)
+        elif os.path.isfile(download_tmp_file):
             downloaded_size = os.path.getsize(download_tmp_file)
             headers["Range"] = f"bytes={downloaded_size}-"
 
         total_size = task_content.sizeBytes
 
+        hasher = hashing.StreamHasher(task_content.hashes)
+        if not task_content.segments and downloaded_size > 0:
+            # The hasher state can not be saved in the task file, hash the part already downloaded.
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, hasher.update_file, download_tmp_file)
+
         if total_size > 0 and downloaded_size == total_size:
             await download_complete()
             return
@@ -495,15 +832,189 @@ class ModelDownload:
         last_update_time = time.time()
         last_downloaded_size = downloaded_size
 
-        response = requests.get(
-            url=model_url,
-            headers=headers,
-            stream=True,
-            allow_redirects=True,
-        )
+        bandwidth = self.download_engine.bandwidth
+
+        async def download_stream():
+            nonlocal downloaded_size
+            nonlocal last_downloaded_size
+            nonlocal total_size
+
+            async with session.get(model_url, headers=headers, allow_redirects=True) as response:
+                self._check_response(response, task_content)
+
+                if response.status == 200 and downloaded_size > 0:
+                    # The server ignored the range request, start over.
+                    utils.print_debug(f"Server does not support resuming {task_content.fullname}, restarting download.")
+                    downloaded_size = 0
+                    last_downloaded_size = 0
+                    open(download_tmp_file, "wb").close()
+                    hasher.reset()
+
+                # When parsing model information from HuggingFace API,
+                # the file size was not found and needs to be obtained from the response header.
+                # Fixed issue #169. Some model information from Civitai, providing the wrong file size
+                response_total_size = self._get_response_total_size(response, downloaded_size)
+                if response_total_size > 0 and (total_size == 0 or total_size != response_total_size):
+                    total_size = response_total_size
+                    task_content.sizeBytes = total_size
+                    task_status.totalSize = total_size
+                    self.set_task_content(task_id, task_content)
+                    self.report_task_status(task_status)
+
+                with open(download_tmp_file, "ab", buffering=0) as f:
+                    writer = BufferWriter(f, hasher)
+                    buffer = bytearray()
+                    try:
+                        async for chunk in self._iter_chunks(response):
+                            await bandwidth.acquire(task_id, len(chunk), task_status.priority)
+                            buffer += chunk
+                            downloaded_size += len(chunk)
+                            if len(buffer) >= self.write_buffer_size:
+                                await writer.write(buffer)
+                                buffer = bytearray()
+
+                            if time.time() - last_update_time >= interval:
+                                await update_progress()
+                    finally:
+                        await writer.write(buffer)
+                        await writer.flush()
+
+        async def download_segment(segment: list[int]):
+            nonlocal downloaded_size
+
+            start, end, done = segment
+            segment_headers = {**headers, "Range": f"bytes={start + done}-{end - 1}"}
+            async with session.get(model_url, headers=segment_headers, allow_redirects=True) as response:
+                self._check_response(response, task_content)
+                if response.status != 206:
+                    raise RuntimeError(f"Server stopped supporting range requests for {task_content.fullname}, delete the task and download it again.")
+
+                with open(download_tmp_file, "r+b", buffering=0) as f:
+                    f.seek(start + segment[2])
+
+                    def record(size: int):
+                        # Only written bytes are recorded, the progress never runs ahead of the file.
+                        segment[2] += size
+
+                    writer = BufferWriter(f, on_written=record)
+                    buffer = bytearray()
+                    received = segment[2]
+                    try:
+                        async for chunk in self._iter_chunks(response):
+                            chunk = chunk[: end - start - received]
+                            await bandwidth.acquire(task_id, len(chunk), task_status.priority)
+                            buffer += chunk
+                            received += len(chunk)
+                            downloaded_size += len(chunk)
+                            if len(buffer) >= self.write_buffer_size:
+                                await writer.write(buffer)
+                                buffer = bytearray()
+
+                            if time.time() - last_update_time >= interval:
+                                await update_progress()
+
+                            if received >= end - start:
+                                break
+                    finally:
+                        await writer.write(buffer)
+                        await writer.flush()
+
+        async def download_segments():
+            if not os.path.isfile(download_tmp_file):
+                # Preallocate the whole file, the segments write into their own range.
+                with open(download_tmp_file, "wb") as f:
+                    f.truncate(int(total_size))
+
+            segments = [segment for segment in task_content.segments if segment[2] < segment[1] - segment[0]]
+            tasks = [asyncio.create_task(download_segment(segment)) for segment in segments]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
 
-        if response.status_code not in (200, 206):
-            raise RuntimeError(f"Failed to download {task_content.fullname}, status code: {response.status_code}")
+        try:
+            if task_content.segments:
+                await download_segments()
+            else:
+                await download_stream()
+        finally:
+            # Also report the progress reached when the task is paused.
+            await update_progress()
+
+        if total_size > 0 and downloaded_size == total_size:
+            await download_complete()
+        else:
+            self.download_queue.set_queued(task_id, False)
+            task_status.status = "pause"
+            self.report_task_status(task_status)
+
+    def _quarantine_download(self, task_id: str, task_content: TaskContent):
+        """
+        Keep the corrupted file aside for inspection, the task starts over on resume.
+        """
+        download_path = utils.get_download_path()
+        download_tmp_file = utils.join_path(download_path, f"{task_id}.download")
+        corrupted_file = utils.join_path(download_path, f"{task_id}.corrupted")
+        # Unqueued first, a restart must not resume the discarded download on its own.
+        self.download_queue.set_queued(task_id, False)
+        os.replace(download_tmp_file, corrupted_file)
+        utils.print_warning(f"Moved corrupted download of {task_content.fullname} to {corrupted_file}")
+        if task_content.segments:
+            task_content.segments = None
+            self.set_task_content(task_id, task_content)
+
+        # Nothing is downloaded anymore, the task must not be reported as complete.
+        task_status = self.get_task_status(task_id)
+        task_status.downloadedSize = 0
+        task_status.progress = 0
+        task_status.bps = 0
+
+    # Chunks grow while the connection delivers them faster than this.
+    chunk_target_duration = 0.05
+    min_chunk_size = 64 * 1024
+    max_chunk_size = 8 * 1024 * 1024
+    write_buffer_size = 8 * 1024 * 1024
+
+    async def _iter_chunks(self, response):
+        """
+        Read the response body in chunks adapted to the throughput.
+        """
+        max_chunk_size = self.max_chunk_size
+        bandwidth = self.download_engine.bandwidth
+        rates = [rate for rate in (bandwidth.get_global_rate(), bandwidth.task_bandwidth) if rate > 0]
+        if rates:
+            # Keep the throttled chunks small, a large chunk would stall for seconds.
+            max_chunk_size = int(min(max_chunk_size, max(self.min_chunk_size, min(rates) / 4)))
+        async for chunk in chunking.iter_adaptive_chunks(response.content, self.min_chunk_size, max_chunk_size, self.chunk_target_duration):
+            yield chunk
+
+    # Files smaller than this are downloaded in a single stream.
+    segment_min_size = 64 * 1024 * 1024
+    segment_count = 4
+
+    async def _plan_segments(self, session, url: str, headers: dict) -> Optional[list[list[int]]]:
+        """
+        Split the file into byte ranges of [start, end, downloaded], or None
+        when the server does not support range requests.
+        """
+        probe_headers = {**headers, "Range": "bytes=0-0"}
+        async with session.get(url, headers=probe_headers, allow_redirects=True) as response:
+            if response.status != 206:
+                return None
+            total_size = int(self._get_response_total_size(response, 0))
+
+        if total_size < self.segment_min_size:
+            return None
+
+        count = min(self.segment_count, math.ceil(total_size / self.segment_min_size))
+        segment_size = math.ceil(total_size / count)
+        return [[start, min(start + segment_size, total_size), 0] for start in range(0, total_size, segment_size)]
+
+    def _check_response(self, response, task_content: TaskContent):
+        if response.status not in (200, 206):
+            raise RuntimeError(f"Failed to download {task_content.fullname}, status code: {response.status}")
 
         # Some models require logging in before they can be downloaded.
         # If no token is carried, it will be redirected to the login page.
@@ -518,32 +1029,17 @@ class ModelDownload:
             # Here we also need to consider how different websites are processed.
             raise RuntimeError(f"{task_content.fullname} needs to be logged in to download. Please set the API-Key first.")
 
-        # When parsing model information from HuggingFace API,
-        # the file size was not found and needs to be obtained from the response header.
-        # Fixed issue #169. Some model information from Civitai, providing the wrong file size
-        response_total_size = float(response.headers.get("content-length", 0))
-        if total_size == 0 or total_size != response_total_size:
-            total_size = response_total_size
-            task_content.sizeBytes = total_size
-            task_status.totalSize = total_size
-            self.set_task_content(task_id, task_content)
-            await utils.send_json("update_download_task", task_content.to_dict())
-
-        with open(download_tmp_file, "ab") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if task_status.status == "pause":
-                    break
-
-                f.write(chunk)
-                downloaded_size += len(chunk)
-
-                if time.time() - last_update_time >= interval:
-                    await update_progress()
-
-        await update_progress()
-
-        if total_size > 0 and downloaded_size == total_size:
-            await download_complete()
-        else:
-            task_status.status = "pause"
-            await utils.send_json("update_download_task", task_status.to_dict())
+    def _get_response_total_size(self, response, downloaded_size: int) -> float:
+        """
+        The size of the whole file, a partial response only carries the
+        length of the rest in Content-Length.
+        """
+        content_range = response.headers.get("content-range", "")
+        if response.status == 206 and "/" in content_range:
+            total = content_range.rsplit("/", 1)[1]
+            if total.isdigit():
+                return float(total)
+        content_length = float(response.headers.get("content-length", 0))
+        if response.status == 206 and content_length > 0:
+            return content_length + downloaded_size
+        return content_length
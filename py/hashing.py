@@ -0,0 +1,283 @@
+import os
+import zlib
+import hashlib
+import sqlite3
+import threading
+import collections
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+from . import utils
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+
+def _is_rotational(device: int) -> Optional[bool]:
+    """
+    Whether the block device is a spinning disk, None if it can not be told
+    (network mounts, non Linux systems).
+    """
+    if not hasattr(os, "major"):
+        return None
+    sys_path = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    # Partitions do not have a queue, the parent device does.
+    for candidate in (f"{sys_path}/queue/rotational", f"{sys_path}/../queue/rotational"):
+        try:
+            with open(candidate, "r", encoding="utf-8") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+class HashEngine:
+    """
+    Hash many files concurrently. hashlib releases the GIL while hashing, so a
+    thread pool scales across cores.
+
+    Files are scheduled per underlying device: a spinning disk only reads one
+    file at a time to avoid seeking, while SSDs are read in parallel.
+    """
+
+    rotational_concurrency = 1
+    solid_state_concurrency = 4
+    unknown_concurrency = 2
+
+    def __init__(self, max_workers: Optional[int] = None, buffer_size: int = 4 * 1024 * 1024):
+        max_workers = max_workers or os.cpu_count() or 4
+        self.buffer_size = buffer_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ModelManagerHash")
+        self._lock = threading.Lock()
+        self._pending: dict[int, collections.deque[tuple[str, Future]]] = {}
+        self._running: dict[int, int] = {}
+        self._limits: dict[int, int] = {}
+
+    def _get_limit(self, device: int):
+        limit = self._limits.get(device, None)
+        if limit is None:
+            rotational = _is_rotational(device)
+            if rotational is None:
+                limit = self.unknown_concurrency
+            elif rotational:
+                limit = self.rotational_concurrency
+            else:
+                limit = self.solid_state_concurrency
+            self._limits[device] = limit
+        return limit
+
+    def submit(self, path: str) -> Future:
+        """
+        Schedule the file to be hashed, the future resolves to the SHA-256 hex digest.
+        """
+        future = Future()
+        try:
+            device = os.stat(path).st_dev
+        except OSError as e:
+            future.set_exception(e)
+            return future
+
+        with self._lock:
+            self._get_limit(device)
+            self._pending.setdefault(device, collections.deque()).append((path, future))
+            self._dispatch(device)
+        return future
+
+    def _dispatch(self, device: int):
+        pending = self._pending[device]
+        while pending and self._running.get(device, 0) < self._limits[device]:
+            path, future = pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._running[device] = self._running.get(device, 0) + 1
+            self._executor.submit(self._run, device, path, future)
+
+    def _run(self, device: int, path: str, future: Future):
+        try:
+            future.set_result(utils.calculate_sha256(path, self.buffer_size))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._running[device] -= 1
+                self._dispatch(device)
+
+
+class _Crc32:
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self):
+        return f"{self.value:08x}"
+
+
+class StreamHasher:
+    """
+    Compute the digests a platform published for a file while it is written.
+
+    SHA-256 is always computed, CRC32 and BLAKE3 only when they are expected
+    (BLAKE3 needs the blake3 package).
+    """
+
+    def __init__(self, expected: Optional[dict[str, str]] = None):
+        self.expected: dict[str, str] = {}
+        for name, value in (expected or {}).items():
+            name = name.upper()
+            if value and (name in ("SHA256", "CRC32") or (name == "BLAKE3" and blake3 is not None)):
+                self.expected[name] = value.lower()
+        self.reset()
+
+    def reset(self):
+        self.size = 0
+        self._hashers = {"SHA256": hashlib.sha256()}
+        if "CRC32" in self.expected:
+            self._hashers["CRC32"] = _Crc32()
+        if "BLAKE3" in self.expected:
+            self._hashers["BLAKE3"] = blake3.blake3()
+
+    def update(self, data):
+        for hasher in self._hashers.values():
+            hasher.update(data)
+        self.size += len(data)
+
+    def update_file(self, path: str, buffer_size: int = 4 * 1024 * 1024):
+        """
+        Hash the rest of the file, from the bytes hashed so far to the end.
+        """
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        with open(path, "rb", buffering=0) as f:
+            f.seek(self.size)
+            while True:
+                size = f.readinto(buffer)
+                if not size:
+                    break
+                self.update(view[:size])
+
+    def hexdigest(self, name: str = "SHA256"):
+        return self._hashers[name].hexdigest()
+
+    def verify(self) -> list[str]:
+        """
+        Return the names of the digests that do not match the expected value.
+        """
+        return [name for name, value in self.expected.items() if self.hexdigest(name) != value]
+
+
+class HashCache:
+    """
+    Persistent SHA-256 cache of model files.
+
+    A digest is keyed by the file path and is only valid as long as the size,
+    mtime and inode of the file are unchanged.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS hashes (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Return the cached digest, or None if the file changed since it was hashed.
+        """
+        path = utils.normalize_path(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, inode, sha256 FROM hashes WHERE path = ?",
+                (path,),
+            ).fetchone()
+
+        if row is None:
+            return None
+        size, mtime_ns, inode, sha256 = row
+        if size != stat.st_size or mtime_ns != stat.st_mtime_ns or inode != stat.st_ino:
+            return None
+        return sha256
+
+    def set(self, path: str, sha256: str, stat: Optional[os.stat_result] = None):
+        path = utils.normalize_path(path)
+        stat = stat or os.stat(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, inode, sha256) VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, stat.st_ino, sha256.lower()),
+            )
+            self._conn.commit()
+
+    def remove(self, path: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM hashes WHERE path = ?", (utils.normalize_path(path),))
+            self._conn.commit()
+
+    def submit(self, path: str) -> Future:
+        """
+        Resolve the digest of the file from the cache, or schedule it on the
+        hash engine and cache the result.
+        """
+        sha256 = self.get(path)
+        if sha256 is not None:
+            future = Future()
+            future.set_result(sha256)
+            return future
+
+        # Stat before reading, a file modified while hashing is hashed again next time.
+        stat = os.stat(path)
+        future = get_hash_engine().submit(path)
+
+        def save(f: Future):
+            if not f.cancelled() and f.exception() is None:
+                self.set(path, f.result(), stat)
+
+        future.add_done_callback(save)
+        return future
+
+    def calculate_sha256(self, path: str) -> str:
+        """
+        Return the cached digest of the file, hashing it only when needed.
+        """
+        return self.submit(path).result()
+
+
+_hash_cache: Optional[HashCache] = None
+_hash_engine: Optional[HashEngine] = None
+_hash_cache_lock = threading.Lock()
+
+
+def get_hash_engine() -> HashEngine:
+    global _hash_engine
+    with _hash_cache_lock:
+        if _hash_engine is None:
+            _hash_engine = HashEngine()
+        return _hash_engine
+
+
+def get_hash_cache() -> HashCache:
+    global _hash_cache
+    with _hash_cache_lock:
+        if _hash_cache is None:
+            _hash_cache = HashCache(utils.join_path(utils.get_cache_path(), "hash_cache.db"))
+        return _hash_cache
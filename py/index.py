@@ -0,0 +1,484 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+
+import folder_paths
+
+from stat import S_ISDIR
+
+from typing import Callable, Optional
+from . import utils
+
+
+class ModelIndex:
+    """
+    Persistent model index backed by SQLite.
+
+    Every directory under the model base paths is recorded together with its
+    mtime. A refresh only re-lists the directories whose mtime changed since the
+    last scan, the others are answered from the index.
+    """
+
+    # Directories modified within this window are rescanned on the next refresh,
+    # some file systems only have a coarse mtime resolution.
+    mtime_settle_seconds = 2.0
+
+    def __init__(self, db_path: str, on_previews: Optional[Callable[[list[str]], None]] = None):
+        self.db_path = db_path
+        # Called with the image previews of every (re)scanned directory.
+        self.on_previews = on_previews
+        self._lock = threading.Lock()
+        # folder -> directories whose models changed since the last take_changes.
+        self._changes: dict[str, set[str]] = {}
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS directories (
+                    folder TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    PRIMARY KEY (folder, path)
+                );
+                CREATE TABLE IF NOT EXISTS models (
+                    folder TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    base_path TEXT NOT NULL,
+                    parent TEXT NOT NULL,
+                    sub_folder TEXT NOT NULL,
+                    basename TEXT NOT NULL,
+                    extension TEXT NOT NULL,
+                    is_folder INTEGER NOT NULL,
+                    hidden INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    updated_at INTEGER NOT NULL,
+                    preview TEXT,
+                    description TEXT,
+                    PRIMARY KEY (folder, path)
+                );
+                CREATE INDEX IF NOT EXISTS models_parent ON models (folder, parent);
+                CREATE INDEX IF NOT EXISTS models_basename ON models (folder, basename COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS models_size ON models (folder, size);
+                CREATE INDEX IF NOT EXISTS models_created_at ON models (folder, created_at);
+                CREATE INDEX IF NOT EXISTS models_updated_at ON models (folder, updated_at);
+                """
+            )
+            self._conn.commit()
+
+    def _check_extensions(self):
+        """
+        Drop the whole index when the supported model extensions changed,
+        files that were skipped before may need to be listed now.
+        """
+        signature = ",".join(sorted(folder_paths.supported_pt_extensions))
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'extensions'").fetchone()
+        if row is not None and row[0] == signature:
+            return
+        self._conn.execute("DELETE FROM models")
+        self._conn.execute("DELETE FROM directories")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('extensions', ?)", (signature,))
+
+    def refresh(self, folder: str):
+        """
+        Bring the index of the model folder up to date with the file system.
+        """
+        for rows in self._refresh_rows(folder, with_rows=False):
+            pass
+
+    def _refresh_rows(self, folder: str, with_rows: bool = True):
+        """
+        Refresh the index of the model folder, yielding the rows of every
+        directory as soon as they are known. Without `with_rows`, the
+        unchanged directories only cost a stat and their subdirectories are
+        looked up.
+        """
+        folders, *others = folder_paths.folder_names_and_paths[folder]
+        base_paths = [utils.normalize_path(p) for p in folders]
+
+        with self._lock:
+            try:
+                self._check_extensions()
+
+                # Forget the base paths that are no longer configured, including
+                # their directory mtimes, so they are rescanned when re-added.
+                placeholders = ",".join("?" * len(base_paths))
+                removed_base_paths = self._conn.execute(
+                    f"SELECT DISTINCT base_path FROM models WHERE folder = ? AND base_path NOT IN ({placeholders})",
+                    (folder, *base_paths),
+                ).fetchall()
+                for (removed_base_path,) in removed_base_paths:
+                    self._remove_subtree(folder, removed_base_path)
+                self._conn.execute(
+                    f"DELETE FROM models WHERE folder = ? AND base_path NOT IN ({placeholders})",
+                    (folder, *base_paths),
+                )
+                self._conn.commit()
+            except:
+                self._conn.rollback()
+                raise
+
+        for base_path in base_paths:
+            yield from self._refresh_tree(folder, base_path, with_rows)
+
+    def _refresh_tree(self, folder: str, base_path: str, with_rows: bool):
+        """
+        Refresh the directories of the base path one by one. The lock is only
+        held while a directory is refreshed, not while its rows are consumed.
+        """
+        stack: list[tuple[str, bool]] = [(base_path, False)]
+        while stack:
+            directory, hidden = stack.pop()
+            with self._lock:
+                try:
+                    rows, subdirectories = self._refresh_directory(folder, base_path, directory, hidden, with_rows)
+                    self._conn.commit()
+                except:
+                    self._conn.rollback()
+                    raise
+            stack.extend(subdirectories)
+            for i in range(0, len(rows), self.scan_chunk_size):
+                yield rows[i : i + self.scan_chunk_size]
+
+    def _refresh_directory(self, folder: str, base_path: str, directory: str, hidden: bool, with_rows: bool):
+        """
+        Refresh the index of a single directory, returns its rows (only when
+        `with_rows` or when it was rescanned) and its (subdirectory, hidden).
+        """
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            stat = None
+        if stat is None or not S_ISDIR(stat.st_mode):
+            self._remove_subtree(folder, directory)
+            return [], []
+        mtime_ns = stat.st_mtime_ns
+
+        row = self._conn.execute(
+            "SELECT mtime_ns FROM directories WHERE folder = ? AND path = ?",
+            (folder, directory),
+        ).fetchone()
+
+        if row is not None and row[0] == mtime_ns:
+            if not with_rows:
+                subdirectories = self._conn.execute(
+                    "SELECT path, hidden FROM models WHERE folder = ? AND parent = ? AND is_folder = 1",
+                    (folder, directory),
+                ).fetchall()
+                return [], [(path, bool(is_hidden)) for path, is_hidden in subdirectories]
+
+            rows = self._conn.execute(
+                "SELECT * FROM models WHERE folder = ? AND parent = ?",
+                (folder, directory),
+            ).fetchall()
+            return rows, [(row[1], bool(row[8])) for row in rows if row[7]]
+
+        utils.print_debug(f"Rescan directory: {directory}")
+        self._changes.setdefault(folder, set()).add(directory)
+        records = self._scan_directory(folder, base_path, directory, hidden)
+        scanned_paths = set(record[1] for record in records)
+
+        indexed_directories = self._conn.execute(
+            "SELECT path FROM models WHERE folder = ? AND parent = ? AND is_folder = 1",
+            (folder, directory),
+        ).fetchall()
+        for (path,) in indexed_directories:
+            if path not in scanned_paths:
+                self._remove_subtree(folder, path)
+
+        self._conn.execute("DELETE FROM models WHERE folder = ? AND parent = ?", (folder, directory))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            records,
+        )
+
+        # A directory that has just been modified may change again within the
+        # same mtime tick, leave it unconfirmed so that it is rescanned later.
+        if time.time() - mtime_ns / 1e9 < self.mtime_settle_seconds:
+            mtime_ns = -1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO directories (folder, path, mtime_ns) VALUES (?, ?, ?)",
+            (folder, directory, mtime_ns),
+        )
+
+        return records, [(record[1], bool(record[8])) for record in records if record[7]]
+
+    # Number of rows yielded at once while a folder is refreshed.
+    scan_chunk_size = 200
+
+    def _scan_directory(self, folder: str, base_path: str, directory: str, hidden: bool):
+        prefix_path = base_path if base_path.endswith("/") else f"{base_path}/"
+
+        entries: list[tuple[os.DirEntry[str], bool]] = []
+        files: list[str] = []
+
+        # List the directory once, the previews and descriptions of all models
+        # are resolved from this listing instead of probing every candidate.
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    is_folder = entry.is_dir()
+                    if not is_folder:
+                        if not entry.is_file():
+                            continue
+                        files.append(entry.name)
+                        extension = os.path.splitext(entry.name)[1]
+                        if extension not in folder_paths.supported_pt_extensions:
+                            continue
+                    entries.append((entry, is_folder))
+                except OSError as e:
+                    utils.print_error(f"{entry.path} is not file or directory: {e}")
+                    continue
+
+        sidecars = utils.get_directory_sidecars(files)
+        file_names = set(files)
+
+        records = []
+        previews: list[str] = []
+        for entry, is_folder in entries:
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                utils.print_error(f"{entry.path} is not file or directory: {e}")
+                continue
+
+            path = utils.normalize_path(entry.path)
+            relative_path = path.replace(prefix_path, "", 1)
+            sub_folder = os.path.dirname(relative_path)
+            basename = entry.name if is_folder else os.path.splitext(entry.name)[0]
+            extension = "" if is_folder else os.path.splitext(entry.name)[1]
+
+            preview = None
+            description = None
+            if not is_folder:
+                preview = utils.get_model_preview_name(path, sidecars)
+                if preview in file_names and utils.resolve_file_content_type(preview) == "image":
+                    previews.append(utils.join_path(directory, preview))
+                descriptions = utils.get_model_all_descriptions(path, sidecars)
+                description = descriptions[0] if len(descriptions) > 0 else None
+
+            records.append(
+                (
+                    folder,
+                    path,
+                    base_path,
+                    utils.normalize_path(directory),
+                    sub_folder,
+                    basename,
+                    extension,
+                    int(is_folder),
+                    int(hidden or entry.name.startswith(".")),
+                    0 if is_folder else stat.st_size,
+                    round(stat.st_ctime_ns / 1000000),
+                    round(stat.st_mtime_ns / 1000000),
+                    preview,
+                    description,
+                )
+            )
+
+        if previews and self.on_previews is not None:
+            self.on_previews(previews)
+
+        return records
+
+    def _remove_subtree(self, folder: str, path: str):
+        prefix = f"{path}/"
+        params = (folder, path, len(prefix), prefix)
+        parents = self._conn.execute(
+            "SELECT DISTINCT parent FROM models WHERE folder = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+            params,
+        ).fetchall()
+        self._changes.setdefault(folder, set()).update(parent for (parent,) in parents)
+        self._conn.execute(
+            "DELETE FROM models WHERE folder = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+            params,
+        )
+        self._conn.execute(
+            "DELETE FROM directories WHERE folder = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+            params,
+        )
+
+    def invalidate(self, folder: str, directory: str):
+        """
+        Force the directory to be rescanned on the next refresh.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE directories SET mtime_ns = -1 WHERE folder = ? AND path = ?",
+                (folder, utils.normalize_path(directory)),
+            )
+            self._conn.commit()
+
+    def take_changes(self, folder: str) -> set[str]:
+        """
+        The directories of the folder whose models were rescanned or removed
+        by the refreshes since the last call.
+        """
+        with self._lock:
+            return self._changes.pop(folder, set())
+
+    def has_changes(self, folder: str) -> bool:
+        with self._lock:
+            return bool(self._changes.get(folder, None))
+
+    def get_directory_records(self, folder: str, directories: set[str]):
+        """
+        Like get_records for the models directly in the directories, without
+        refreshing the index.
+        """
+        folders, *others = folder_paths.folder_names_and_paths[folder]
+        path_indexes = {utils.normalize_path(p): i for i, p in enumerate(folders)}
+
+        directories = list(directories)
+        rows = []
+        with self._lock:
+            for i in range(0, len(directories), 500):
+                chunk = directories[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(
+                    self._conn.execute(
+                        f"SELECT * FROM models WHERE folder = ? AND parent IN ({placeholders})",
+                        (folder, *chunk),
+                    ).fetchall()
+                )
+
+        return [(row[1], bool(row[8]), self._to_model(row, path_indexes)) for row in rows if row[2] in path_indexes]
+
+    def get_records(self, folder: str):
+        """
+        Refresh the index of the model folder and return a list of
+        (path, hidden, model) tuples.
+        """
+        self.refresh(folder)
+
+        folders, *others = folder_paths.folder_names_and_paths[folder]
+        path_indexes = {utils.normalize_path(p): i for i, p in enumerate(folders)}
+
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM models WHERE folder = ?", (folder,)).fetchall()
+
+        return [(row[1], bool(row[8]), self._to_model(row, path_indexes)) for row in rows if row[2] in path_indexes]
+
+    def iter_records(self, folder: str):
+        """
+        Like get_records, but yields the records in chunks while the index
+        is being refreshed, so the first models are available before the
+        whole folder is scanned.
+        """
+        folders, *others = folder_paths.folder_names_and_paths[folder]
+        path_indexes = {utils.normalize_path(p): i for i, p in enumerate(folders)}
+
+        for rows in self._refresh_rows(folder):
+            yield [(row[1], bool(row[8]), self._to_model(row, path_indexes)) for row in rows if row[2] in path_indexes]
+
+    def get_models(self, folder: str, include_hidden_files: bool = False):
+        """
+        Refresh the index of the model folder and return the model list.
+        """
+        records = self.get_records(folder)
+        return [model for path, hidden, model in records if include_hidden_files or not hidden]
+
+    sort_columns = {
+        "name": "basename COLLATE NOCASE",
+        "size": "size",
+        "createdAt": "created_at",
+        "updatedAt": "updated_at",
+    }
+
+    def query_models(
+        self,
+        folder: str,
+        include_hidden_files: bool = False,
+        include_folders: bool = True,
+        sub_folder: Optional[str] = None,
+        search: Optional[str] = None,
+        extensions: Optional[list[str]] = None,
+        sort: str = "name",
+        order: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ):
+        """
+        Filter, sort and page the indexed models without refreshing the index.
+        Returns the total number of matched models and the requested page.
+
+        The search is split by whitespace, every token must match either the
+        sub folder or the basename, `*` matches any characters.
+        """
+        if sort not in self.sort_columns:
+            raise RuntimeError(f"Invalid sort key: {sort}")
+        if order is None:
+            order = "asc" if sort == "name" else "desc"
+        if order not in ("asc", "desc"):
+            raise RuntimeError(f"Invalid sort order: {order}")
+
+        conditions = ["folder = ?"]
+        params: list = [folder]
+
+        if not include_hidden_files:
+            conditions.append("hidden = 0")
+
+        if not include_folders:
+            conditions.append("is_folder = 0")
+
+        if sub_folder:
+            sub_folder = sub_folder.strip("/")
+            prefix = f"{sub_folder}/"
+            conditions.append("(sub_folder = ? OR substr(sub_folder, 1, ?) = ?)")
+            params.extend([sub_folder, len(prefix), prefix])
+
+        if extensions:
+            placeholders = ",".join("?" * len(extensions))
+            conditions.append(f"extension IN ({placeholders})")
+            params.extend(extensions)
+
+        for token in (search or "").split():
+            pattern = re.sub(r"([\\%_])", r"\\\1", token).replace("*", "%")
+            conditions.append("(basename LIKE ? ESCAPE '\\' OR sub_folder LIKE ? ESCAPE '\\')")
+            params.extend([f"%{pattern}%", f"%{pattern}%"])
+
+        where = " AND ".join(conditions)
+        folders, *others = folder_paths.folder_names_and_paths[folder]
+        path_indexes = {utils.normalize_path(p): i for i, p in enumerate(folders)}
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM models WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM models WHERE {where} ORDER BY {self.sort_columns[sort]} {order}, path LIMIT ? OFFSET ?",
+                (*params, -1 if limit is None else limit, offset),
+            ).fetchall()
+
+        models = [self._to_model(row, path_indexes) for row in rows if row[2] in path_indexes]
+        return total, models
+
+    def _to_model(self, row: tuple, path_indexes: dict[str, int]):
+        folder, path, base_path, parent, sub_folder, basename, extension, is_folder, hidden, size, created_at, updated_at, preview, description = row
+        path_index = path_indexes[base_path]
+
+        model_preview = None
+        if not is_folder:
+            preview_ext = os.path.splitext(preview)[1]
+            preview_path = "/".join(filter(None, [sub_folder, f"{basename}{preview_ext}"]))
+            model_preview = f"/model-manager/preview/{folder}/{path_index}/{preview_path}"
+
+        return {
+            "type": folder,
+            "subFolder": sub_folder,
+            "isFolder": bool(is_folder),
+            "basename": basename,
+            "extension": extension,
+            "pathIndex": path_index,
+            "sizeBytes": size,
+            "preview": model_preview,
+            "createdAt": created_at,
+            "updatedAt": updated_at,
+        }
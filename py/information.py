@@ -1,9 +1,10 @@
 import os
 import re
-import uuid
-import math
+import json
+import time
+import base64
+import asyncio
 import yaml
-import requests
 import markdownify
 
 
@@ -12,14 +13,18 @@ import folder_paths
 
 from aiohttp import web
 from abc import ABC, abstractmethod
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, parse_qs
-from PIL import Image
-from io import BytesIO
 
 
 from . import utils
 from . import config
 from . import thread
+from . import hashing
+from . import network
+from . import progress
+from . import preview
 
 
 class ModelSearcher(ABC):
@@ -45,6 +50,9 @@ class UnknownWebsiteSearcher(ModelSearcher):
 
 
 class CivitaiModelSearcher(ModelSearcher):
+    def __init__(self, rate_limiter: Optional[thread.RateLimiter] = None):
+        self.rate_limiter = rate_limiter
+
     def search_by_url(self, url: str):
         parsed_url = urlparse(url)
 
@@ -58,13 +66,20 @@ class CivitaiModelSearcher(ModelSearcher):
         if not model_id:
             return []
 
-        response = requests.get(f"https://civitai.com/api/v1/models/{model_id}")
-        response.raise_for_status()
-        res_data: dict = response.json()
+        res_data = self._fetch_model(model_id)
+        version_ids = [int(version_id)] if version_id else None
+        return self._resolve_models(model_id, res_data, version_ids)
+
+    def _get_json(self, url: str):
+        return network.get_response_cache().get_json(url, rate_limiter=self.rate_limiter)
+
+    def _fetch_model(self, model_id) -> dict:
+        return self._get_json(f"https://civitai.com/api/v1/models/{model_id}")
 
+    def _resolve_models(self, model_id, res_data: dict, version_ids: Optional[list[int]] = None):
         model_versions: list[dict] = res_data["modelVersions"]
-        if version_id:
-            model_versions = utils.filter_with(model_versions, {"id": int(version_id)})
+        if version_ids is not None:
+            model_versions = [version for version in model_versions if version.get("id") in version_ids]
 
         models: list[dict] = []
 
@@ -136,9 +151,7 @@ class CivitaiModelSearcher(ModelSearcher):
         if not hash:
             raise RuntimeError(f"Hash value is empty.")
 
-        response = requests.get(f"https://civitai.com/api/v1/model-versions/by-hash/{hash}")
-        response.raise_for_status()
-        version: dict = response.json()
+        version: dict = self._get_json(f"https://civitai.com/api/v1/model-versions/by-hash/{hash}")
 
         model_id = version.get("modelId")
         version_id = version.get("id")
@@ -147,12 +160,70 @@ class CivitaiModelSearcher(ModelSearcher):
 
         models = self.search_by_url(model_page)
 
+        model = self._match_hash(models, hash, version_id)
+        if model is None:
+            raise RuntimeError(f"No model found with hash {hash}")
+        return model
+
+    # Maximum number of hashes sent in one bulk request.
+    bulk_hash_size = 100
+
+    def search_by_hashes(self, hashes: list[str]) -> dict[str, dict]:
+        """
+        Look up many hashes with the bulk by-hash endpoint. The follow-up model
+        requests are shared by all the versions of the same model.
+
+        Returns a dict of hash to model info, hashes that are not found are left out.
+        """
+        hashes = list(dict.fromkeys(h for h in hashes if h))
+        versions: list[dict] = []
+        for i in range(0, len(hashes), self.bulk_hash_size):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            response = network.get_http_client().post(
+                "https://civitai.com/api/v1/model-versions/by-hash",
+                json=hashes[i : i + self.bulk_hash_size],
+            )
+            response.raise_for_status()
+            versions.extend(response.json())
+
+        # Find which version every hash belongs to.
+        hash_versions: dict[str, dict] = {}
+        requested = {h.lower(): h for h in hashes}
+        for version in versions:
+            for file in version.get("files", []):
+                sha256 = (file.get("hashes", {}).get("SHA256") or "").lower()
+                if sha256 in requested:
+                    hash_versions[requested[sha256]] = version
+
+        model_versions: dict[int, set[int]] = {}
+        for version in hash_versions.values():
+            model_versions.setdefault(version.get("modelId"), set()).add(version.get("id"))
+
+        result: dict[str, dict] = {}
+        for model_id, version_ids in model_versions.items():
+            res_data = self._fetch_model(model_id)
+            models = self._resolve_models(model_id, res_data, list(version_ids))
+            for hash, version in hash_versions.items():
+                if version.get("modelId") != model_id:
+                    continue
+                model = self._match_hash(models, hash, version.get("id"))
+                if model is not None:
+                    result[hash] = model
+
+        return result
+
+    def _match_hash(self, models: list[dict], hash: str, version_id=None):
+        for model in models:
+            sha256 = (model.get("hashes") or {}).get("SHA256") or ""
+            if sha256.lower() == hash.lower():
+                return model
+
         for model in models:
-            sha256 = model.get("hashes", {}).get("SHA256")
-            if sha256 == hash:
+            if model.get("id") == version_id:
                 return model
 
-        return models[0]
+        return models[0] if len(models) > 0 else None
 
     def _resolve_model_type(self, model_type: str):
         map_legacy = {
@@ -178,9 +249,7 @@ class HuggingfaceModelSearcher(ModelSearcher):
         model_id = f"{space}/{name}"
         rest_pathname = "/".join(rest_paths)
 
-        response = requests.get(f"https://huggingface.co/api/models/{model_id}")
-        response.raise_for_status()
-        res_data: dict = response.json()
+        res_data: dict = network.get_response_cache().get_json(f"https://huggingface.co/api/models/{model_id}")
 
         sibling_files: list[str] = [x.get("rfilename") for x in res_data.get("siblings", [])]
 
@@ -299,6 +368,12 @@ class HuggingfaceModelSearcher(ModelSearcher):
 
 
 class Information:
+    # The preview URLs are not versioned, so the browser keeps the previews but
+    # revalidates them on every use. The FileResponse validators (ETag and
+    # Last-Modified) follow the source file, an unchanged preview is answered
+    # with an empty 304.
+    preview_headers = {"Cache-Control": "private, no-cache"}
+
     def add_routes(self, routes):
 
         @routes.get("/model-manager/model-info")
@@ -308,7 +383,7 @@ class Information:
             """
             try:
                 model_page = request.query.get("model-page", None)
-                result = self.fetch_model_info(model_page)
+                result = await thread.blocking_executor.run("model-info", self.fetch_model_info, model_page)
                 return web.json_response({"success": True, "data": result})
             except Exception as e:
                 error_msg = f"Fetch model info failed: {str(e)}"
@@ -352,6 +427,47 @@ class Information:
                 utils.print_error(error_msg)
                 return web.json_response({"success": False, "error": error_msg})
 
+        @routes.get("/model-manager/model-info/scan/metrics")
+        async def get_scan_metrics(request):
+            """
+            Get the worker and queue metrics of the scan executor.
+            """
+            return web.json_response({"success": True, "data": self.scan_executor.metrics()})
+
+        @routes.get("/model-manager/hash/{type}/{index}/{filename:.*}")
+        async def read_model_hash(request):
+            """
+            Get the SHA-256 of the specified model from the hash cache.
+
+            - compute: `true` to hash the model if it is not cached, otherwise null is returned.
+            """
+            model_type = request.match_info.get("type", None)
+            path_index = int(request.match_info.get("index", None))
+            filename = request.match_info.get("filename", None)
+            compute = request.query.get("compute", "false") == "true"
+
+            try:
+                model_path = utils.get_valid_full_path(model_type, path_index, filename)
+                if model_path is None:
+                    raise RuntimeError(f"File {filename} not found")
+                hash_cache = hashing.get_hash_cache()
+                if compute:
+                    sha256 = await thread.blocking_executor.run("hash", hash_cache.calculate_sha256, model_path)
+                else:
+                    sha256 = await thread.blocking_executor.run("model", hash_cache.get, model_path)
+                return web.json_response({"success": True, "data": {"sha256": sha256}})
+            except Exception as e:
+                error_msg = f"Read model hash failed: {str(e)}"
+                utils.print_error(error_msg)
+                return web.json_response({"success": False, "error": error_msg})
+
+        @routes.get("/model-manager/preview/metrics")
+        async def get_preview_metrics(request):
+            """
+            Get the worker and queue metrics of the preview renderer.
+            """
+            return web.json_response({"success": True, "data": preview.get_preview_cache().renderer.metrics()})
+
         @routes.get("/model-manager/preview/{type}/{index}/{filename:.*}")
         async def read_model_preview(request):
             """
@@ -361,37 +477,91 @@ class Information:
             :param type: The type of the model. eg.checkpoints, loras, vae, etc.
             :param index: The index of the model folders.
             :param filename: The filename of the preview.
+            :query size: Optional, alias `w`. Images are rendered at the smallest
+                rendition (128, 256, 512 or 1024 pixels) covering this size.
             """
             model_type = request.match_info.get("type", None)
             index = int(request.match_info.get("index", None))
             filename = request.match_info.get("filename", None)
-
-            extension_uri = config.extension_uri
-
+            requested_size = request.query.get("size", request.query.get("w", None))
             try:
-                folders = folder_paths.get_folder_paths(model_type)
-                base_path = folders[index]
-                abs_path = utils.join_path(base_path, filename)
-                preview_name = utils.get_model_preview_name(abs_path)
-                if preview_name:
-                    dir_name = os.path.dirname(abs_path)
-                    abs_path = utils.join_path(dir_name, preview_name)
-            except:
-                abs_path = extension_uri
-
-            if not os.path.isfile(abs_path):
-                abs_path = utils.join_path(extension_uri, "assets", "no-preview.png")
+                requested_size = int(requested_size) if requested_size else None
+            except ValueError:
+                requested_size = None
+
+            abs_path = await thread.blocking_executor.run("preview", self.resolve_preview_path, model_type, index, filename)
 
             # Determine content type from the actual file
             content_type = utils.resolve_file_content_type(abs_path)
 
             if content_type == "video":
                 # Serve video files directly
-                return web.FileResponse(abs_path)
+                return web.FileResponse(abs_path, headers=self.preview_headers)
             else:
-                # Serve image files (WebP or fallback images)
-                image_data = self.get_image_preview_data(abs_path)
-                return web.Response(body=image_data.getvalue(), content_type="image/webp")
+                # Serve image files (WebP or fallback images) from the rendition cache
+                preview_cache = preview.get_preview_cache()
+                preview_size = preview_cache.resolve_size(requested_size)
+                if requested_size is not None:
+                    preview_cache.warm_size = preview_size
+                preview_path = await preview_cache.get(abs_path, preview_size)
+                return web.FileResponse(preview_path, headers={**self.preview_headers, "Content-Type": "image/webp"})
+
+        @routes.post("/model-manager/preview/batch")
+        async def read_model_previews(request):
+            """
+            Get the renditions of many model previews in one request, meant for
+            the small thumbnails of the initial grid.
+
+            The body is `{"previews": [...], "size": 128}`, the previews being
+            the preview URLs of the models. The response is newline delimited
+            JSON in the order the renditions are ready, a `{"preview", "data"}`
+            line with a data URI per preview, or `{"preview", "error"}`.
+            """
+            try:
+                body = await request.json()
+                previews = body.get("previews", [])
+                if not isinstance(previews, list) or not all(isinstance(url, str) for url in previews):
+                    raise ValueError("previews must be a list of preview URLs")
+                previews: list[str] = previews[: self.max_batch_previews]
+                requested_size = body.get("size", None)
+                requested_size = int(requested_size) if requested_size else None
+            except Exception as e:
+                error_msg = f"Read model previews failed: {str(e)}"
+                utils.print_error(error_msg)
+                return web.json_response({"success": False, "error": error_msg})
+
+            preview_cache = preview.get_preview_cache()
+            preview_size = preview_cache.resolve_size(requested_size)
+            if requested_size is not None:
+                preview_cache.warm_size = preview_size
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+
+            async def read_rendition(url: str):
+                try:
+                    source = await thread.blocking_executor.run("preview", self.resolve_preview_url, url)
+                    if source is None or utils.resolve_file_content_type(source) != "image":
+                        raise RuntimeError(f"{url} is not an image preview")
+                    rendition_path = await preview_cache.get(source, preview_size)
+                    data = await thread.blocking_executor.run("preview", self.read_data_uri, rendition_path)
+                    return {"preview": url, "data": data}
+                except Exception as e:
+                    return {"preview": url, "error": str(e)}
+
+            tasks = [asyncio.ensure_future(read_rendition(url)) for url in previews]
+            try:
+                for rendition in asyncio.as_completed(tasks):
+                    line = await rendition
+                    await response.write(f"{json.dumps(line)}\n".encode("utf-8"))
+                await response.write_eof()
+            except ConnectionResetError:
+                utils.print_debug("Read model previews cancelled, the client went away.")
+            finally:
+                # Renders still waiting for a slot are dropped with the request.
+                for task in tasks:
+                    task.cancel()
+            return response
 
         @routes.get("/model-manager/preview/download/{filename}")
         async def read_download_preview(request):
@@ -401,68 +571,53 @@ class Information:
             download_path = utils.get_download_path()
             preview_path = utils.join_path(download_path, filename)
 
-            if not os.path.isfile(preview_path):
+            if not utils.is_subpath(preview_path, download_path) or not os.path.isfile(preview_path):
                 preview_path = utils.join_path(extension_uri, "assets", "no-preview.png")
 
-            return web.FileResponse(preview_path)
-
-    def get_image_preview_data(self, filename: str):
-        with Image.open(filename) as img:
-            max_size = 1024
-            original_format = img.format
-
-            exif_data = img.info.get("exif")
-            icc_profile = img.info.get("icc_profile")
-
-            if getattr(img, "is_animated", False) and img.n_frames > 1:
-                total_frames = img.n_frames
-                step = max(1, math.ceil(total_frames / 30))
-
-                frames, durations = [], []
-
-                for frame_idx in range(0, total_frames, step):
-                    img.seek(frame_idx)
-                    frame = img.copy()
-                    frame.thumbnail((max_size, max_size), Image.Resampling.NEAREST)
-
-                    frames.append(frame)
-                    durations.append(img.info.get("duration", 100) * step)
-
-                save_args = {
-                    "format": "WEBP",
-                    "save_all": True,
-                    "append_images": frames[1:],
-                    "duration": durations,
-                    "loop": 0,
-                    "quality": 80,
-                    "method": 0,
-                    "allow_mixed": False,
-                }
-
-                if exif_data:
-                    save_args["exif"] = exif_data
+            return web.FileResponse(preview_path, headers=self.preview_headers)
 
-                if icc_profile:
-                    save_args["icc_profile"] = icc_profile
+    max_batch_previews = 200
 
-                img_byte_arr = BytesIO()
-                frames[0].save(img_byte_arr, **save_args)
-                img_byte_arr.seek(0)
-                return img_byte_arr
+    def resolve_preview_path(self, model_type: str, index: int, filename: str):
+        """
+        The absolute path of the preview of the model, no-preview.png when
+        it does not have one.
+        """
+        extension_uri = config.extension_uri
 
-            img.thumbnail((max_size, max_size), Image.Resampling.BICUBIC)
-
-            img_byte_arr = BytesIO()
-            save_args = {"format": "WEBP", "quality": 80}
-
-            if exif_data:
-                save_args["exif"] = exif_data
-            if icc_profile:
-                save_args["icc_profile"] = icc_profile
-
-            img.save(img_byte_arr, **save_args)
-            img_byte_arr.seek(0)
-            return img_byte_arr
+        try:
+            folders = folder_paths.get_folder_paths(model_type)
+            base_path = folders[index]
+            abs_path = utils.join_path(base_path, filename)
+            if not utils.is_subpath(abs_path, base_path):
+                raise RuntimeError(f"{filename} is outside of the model folder")
+            preview_name = utils.get_model_preview_name(abs_path)
+            if preview_name:
+                dir_name = os.path.dirname(abs_path)
+                abs_path = utils.join_path(dir_name, preview_name)
+        except:
+            abs_path = extension_uri
+
+        if not os.path.isfile(abs_path):
+            abs_path = utils.join_path(extension_uri, "assets", "no-preview.png")
+        return abs_path
+
+    def resolve_preview_url(self, url: str) -> Optional[str]:
+        """
+        Like resolve_preview_path, for a `/model-manager/preview/{type}/{index}/{filename}` URL.
+        """
+        prefix = "/model-manager/preview/"
+        if not url.startswith(prefix):
+            return None
+        parts = url[len(prefix) :].split("/", 2)
+        if len(parts) != 3 or not parts[1].isdigit():
+            return None
+        model_type, index, filename = parts
+        return self.resolve_preview_path(model_type, int(index), filename)
+
+    def read_data_uri(self, filename: str):
+        with open(filename, "rb") as f:
+            return f"data:image/webp;base64,{base64.b64encode(f.read()).decode('ascii')}"
 
     def fetch_model_info(self, model_page: str):
         if not model_page:
@@ -511,66 +666,205 @@ class Information:
         await self.download_model_info(request)
         return scan_info_task_content
 
-    download_thread_pool = thread.DownloadThreadPool()
+    scan_executor = thread.TaskExecutor(max_workers=2, name="ModelManagerScan")
+
+    # Number of models buffered between two stages of the scan pipeline.
+    scan_queue_size = 16
+    # Number of concurrent preview downloads and sidecar writes.
+    scan_io_concurrency = 4
+    # Minimum interval in seconds between two saves of the scan task file.
+    scan_save_interval = 1.0
+    # Number of hashes looked up at once, and how long to wait to fill a batch.
+    scan_batch_size = 50
+    scan_batch_wait = 0.5
 
     async def download_model_info(self, request):
+        api_concurrency = max(1, int(utils.get_setting_value(request, "scan.api_concurrency", 4) or 4))
+        api_rate_limit = float(utils.get_setting_value(request, "scan.api_rate_limit", 2) or 0)
+
         async def download_information_task(task_id: str):
+            """
+            Scan the models as a pipeline:
+            check sidecars -> hash -> search Civitai -> save preview and description -> record.
+            Each stage runs concurrently and is connected to the next by a bounded queue.
+            """
             scan_info_task_file = self.get_scan_information_task_filepath()
             scan_info_task_content = utils.load_dict_pickle_file(scan_info_task_file)
             scan_mode = scan_info_task_content.get("mode", "diff")
             scan_models: dict[str, bool] = scan_info_task_content.get("models", {})
-            for key, value in scan_models.items():
-                if value is True:
-                    continue
 
-                abs_model_path = key
+            loop = asyncio.get_running_loop()
+            hash_cache = hashing.get_hash_cache()
+            rate_limiter = thread.RateLimiter(api_rate_limit)
+            api_executor = ThreadPoolExecutor(max_workers=api_concurrency, thread_name_prefix="ModelManagerScanApi")
+            io_executor = ThreadPoolExecutor(max_workers=self.scan_io_concurrency, thread_name_prefix="ModelManagerScanIO")
+
+            search_queue: asyncio.Queue = asyncio.Queue(maxsize=self.scan_queue_size)
+            save_queue: asyncio.Queue = asyncio.Queue(maxsize=self.scan_queue_size)
+            record_queue: asyncio.Queue = asyncio.Queue()
+
+            def check_model(abs_model_path: str):
                 base_path = os.path.dirname(abs_model_path)
 
                 image_name = utils.get_model_preview_name(abs_model_path)
                 abs_image_path = utils.join_path(base_path, image_name)
-
                 has_preview = os.path.isfile(abs_image_path)
 
                 description_name = utils.get_model_description_name(abs_model_path)
                 abs_description_path = utils.join_path(base_path, description_name) if description_name else None
                 has_description = os.path.isfile(abs_description_path) if abs_description_path else False
 
-                try:
-                    utils.print_info(f"Checking model {abs_model_path}")
-                    utils.print_debug(f"Scan mode: {scan_mode}")
-                    utils.print_debug(f"Has preview: {has_preview}")
-                    utils.print_debug(f"Has description: {has_description}")
+                utils.print_info(f"Checking model {abs_model_path}")
+                utils.print_debug(f"Scan mode: {scan_mode}")
+                utils.print_debug(f"Has preview: {has_preview}")
+                utils.print_debug(f"Has description: {has_description}")
+                return scan_mode == "full" or not has_preview or not has_description
 
-                    if scan_mode == "full" or not has_preview or not has_description:
-                        utils.print_debug(f"Calculate sha256 for {abs_model_path}")
-                        hash_value = utils.calculate_sha256(abs_model_path)
-                        utils.print_info(f"Searching model info by hash {hash_value}")
-                        model_info = CivitaiModelSearcher().search_by_hash(hash_value)
-
-                        preview_url_list = model_info.get("preview", [])
-                        preview_url = preview_url_list[0] if preview_url_list else None
-                        if preview_url:
-                            utils.print_debug(f"Save preview to {abs_model_path}")
-                            utils.save_model_preview(abs_model_path, preview_url)
-
-                        description = model_info.get("description", None)
-                        if description:
-                            utils.save_model_description(abs_model_path, description)
-
-                    scan_models[abs_model_path] = True
-                    scan_info_task_content["models"] = scan_models
-                    utils.save_dict_pickle_file(scan_info_task_file, scan_info_task_content)
-                    utils.print_debug(f"Send update scan information task to frontend.")
-                    await utils.send_json("update_scan_information_task", scan_info_task_content)
+            def search_model_infos(hash_values: list[str]):
+                utils.print_info(f"Searching model info by {len(hash_values)} hashes")
+                searcher = CivitaiModelSearcher(rate_limiter)
+                try:
+                    return searcher.search_by_hashes(hash_values)
                 except Exception as e:
-                    utils.print_error(f"Failed to download model info for {abs_model_path}: {e}")
+                    # Fall back to one request per hash when the bulk lookup is not available.
+                    utils.print_warning(f"Bulk hash lookup failed: {e}")
+                    result: dict[str, dict] = {}
+                    for hash_value in hash_values:
+                        try:
+                            result[hash_value] = searcher.search_by_hash(hash_value)
+                        except Exception as e:
+                            utils.print_error(f"Failed to search model info by hash {hash_value}: {e}")
+                    return result
+
+            def save_model_info(abs_model_path: str, model_info: dict):
+                preview_url_list = model_info.get("preview", [])
+                preview_url = preview_url_list[0] if preview_url_list else None
+                if preview_url:
+                    utils.print_debug(f"Save preview to {abs_model_path}")
+                    utils.save_model_preview(abs_model_path, preview_url)
+
+                description = model_info.get("description", None)
+                if description:
+                    utils.save_model_description(abs_model_path, description)
+
+            async def check_stage():
+                for abs_model_path, value in list(scan_models.items()):
+                    if value is True:
+                        continue
+                    try:
+                        need_search = await loop.run_in_executor(io_executor, check_model, abs_model_path)
+                        if not need_search:
+                            await record_queue.put(abs_model_path)
+                            continue
+                        utils.print_debug(f"Calculate sha256 for {abs_model_path}")
+                        hash_future = asyncio.wrap_future(hash_cache.submit(abs_model_path))
+                        await search_queue.put((abs_model_path, hash_future))
+                    except Exception as e:
+                        utils.print_error(f"Failed to download model info for {abs_model_path}: {e}")
+
+            async def search_stage():
+                finished = False
+                while not finished:
+                    # Collect the hashed models into one bulk lookup, without
+                    # holding back the batch when the queue runs dry.
+                    batch: list[tuple[str, asyncio.Future]] = []
+                    while len(batch) < self.scan_batch_size:
+                        try:
+                            timeout = None if len(batch) == 0 else self.scan_batch_wait
+                            item = await asyncio.wait_for(search_queue.get(), timeout)
+                        except asyncio.TimeoutError:
+                            break
+                        if item is None:
+                            finished = True
+                            break
+                        batch.append(item)
+
+                    if len(batch) == 0:
+                        continue
+
+                    hashed_models: dict[str, list[str]] = {}
+                    for abs_model_path, hash_future in batch:
+                        try:
+                            hash_value = await hash_future
+                            hashed_models.setdefault(hash_value, []).append(abs_model_path)
+                        except Exception as e:
+                            utils.print_error(f"Failed to download model info for {abs_model_path}: {e}")
+
+                    if len(hashed_models) == 0:
+                        continue
+
+                    try:
+                        model_infos = await loop.run_in_executor(api_executor, search_model_infos, list(hashed_models.keys()))
+                    except Exception as e:
+                        utils.print_error(f"Failed to search model info: {e}")
+                        continue
+
+                    for hash_value, abs_model_paths in hashed_models.items():
+                        model_info = model_infos.get(hash_value, None)
+                        for abs_model_path in abs_model_paths:
+                            if model_info is None:
+                                utils.print_error(f"Failed to download model info for {abs_model_path}: not found by hash {hash_value}")
+                                continue
+                            await save_queue.put((abs_model_path, model_info))
+
+            async def save_stage():
+                while True:
+                    item = await save_queue.get()
+                    if item is None:
+                        break
+                    abs_model_path, model_info = item
+                    try:
+                        await loop.run_in_executor(io_executor, save_model_info, abs_model_path, model_info)
+                        await record_queue.put(abs_model_path)
+                    except Exception as e:
+                        utils.print_error(f"Failed to download model info for {abs_model_path}: {e}")
+
+            async def record_stage():
+                last_save_time = 0.0
+                changed = False
+                while True:
+                    abs_model_path = await record_queue.get()
+                    if abs_model_path is not None:
+                        scan_models[abs_model_path] = True
+                        changed = True
+
+                    # Save the progress at most once per interval instead of per model.
+                    now = time.monotonic()
+                    if changed and (abs_model_path is None or now - last_save_time >= self.scan_save_interval):
+                        scan_info_task_content["models"] = scan_models
+                        utils.save_dict_pickle_file(scan_info_task_file, scan_info_task_content)
+                        progress.broadcaster.publish("update_scan_information_task", "scan", scan_info_task_content)
+                        last_save_time = now
+                        changed = False
+
+                    if abs_model_path is None:
+                        break
+
+            try:
+                search_workers = [asyncio.ensure_future(search_stage()) for _ in range(api_concurrency)]
+                save_workers = [asyncio.ensure_future(save_stage()) for _ in range(self.scan_io_concurrency)]
+                recorder = asyncio.ensure_future(record_stage())
+
+                await check_stage()
+                for _ in search_workers:
+                    await search_queue.put(None)
+                await asyncio.gather(*search_workers)
+                for _ in save_workers:
+                    await save_queue.put(None)
+                await asyncio.gather(*save_workers)
+                await record_queue.put(None)
+                await recorder
+            finally:
+                api_executor.shutdown(wait=False)
+                io_executor.shutdown(wait=False)
 
             os.remove(scan_info_task_file)
+            progress.broadcaster.forget("update_scan_information_task", "scan")
             utils.print_info("Completed scan model information.")
 
         try:
-            task_id = uuid.uuid4().hex
-            self.download_thread_pool.submit(download_information_task, task_id)
+            # Polling the task list resubmits the scan, the fixed id keeps it running once.
+            self.scan_executor.submit(download_information_task, "scan_information")
         except Exception as e:
             utils.print_debug(str(e))
 
@@ -1,13 +1,19 @@
 import os
-import folder_paths
+import json
+import asyncio
+import threading
 from aiohttp import web
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 from . import utils
+from . import watcher
+from . import thread
 
 
 class ModelManager:
+    def __init__(self):
+        self.model_watcher = watcher.get_model_watcher()
+        self.model_index = self.model_watcher.model_index
 
     def add_routes(self, routes):
 
@@ -35,15 +41,75 @@ class ModelManager:
 
         @routes.get("/model-manager/models/{folder}")
         async def get_folder_models(request):
+            """
+            Returns the models of the folder.
+
+            All query parameters are optional, without them the whole folder is returned.
+            - subFolder: only models in this sub folder and its descendants.
+            - search: whitespace separated tokens matching sub folder or name, `*` is a wildcard.
+            - extension: comma separated extensions, eg. `.safetensors,.ckpt`.
+            - isFolder: `false` to exclude folders.
+            - sort: name, size, createdAt or updatedAt.
+            - order: asc or desc.
+            - offset, limit: when limit is given, a page `{ total, offset, limit, items }` is returned.
+            """
             try:
                 folder = request.match_info.get("folder", None)
-                results = self.scan_models(folder, request)
+                results = await thread.blocking_executor.run("models", self.scan_models, folder, request)
                 return web.json_response({"success": True, "data": results})
             except Exception as e:
                 error_msg = f"Read models failed: {str(e)}"
                 utils.print_error(error_msg)
                 return web.json_response({"success": False, "error": error_msg})
 
+        @routes.get("/model-manager/models/{folder}/stream")
+        async def stream_folder_models(request):
+            """
+            Like `/model-manager/models/{folder}`, but the models are streamed as
+            newline delimited JSON while the folder is scanned.
+            If the scan fails, the last line is `{"error": "..."}`.
+            """
+            folder = request.match_info.get("folder", None)
+            include_hidden_files = utils.get_setting_value(request, "scan.include_hidden_files", False)
+            self.model_watcher.start()
+
+            response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+            await response.prepare(request)
+
+            loop = asyncio.get_running_loop()
+            chunks: asyncio.Queue = asyncio.Queue()
+            cancelled = threading.Event()
+
+            def scan():
+                try:
+                    for models in self.model_watcher.iter_models(folder, include_hidden_files):
+                        if cancelled.is_set():
+                            break
+                        loop.call_soon_threadsafe(chunks.put_nowait, models)
+                    loop.call_soon_threadsafe(chunks.put_nowait, None)
+                except Exception as e:
+                    error_msg = f"Read models failed: {str(e)}"
+                    utils.print_error(error_msg)
+                    loop.call_soon_threadsafe(chunks.put_nowait, {"error": error_msg})
+
+            asyncio.ensure_future(thread.blocking_executor.run("models", scan))
+
+            try:
+                while True:
+                    chunk = await chunks.get()
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, dict):
+                        await response.write(f"{json.dumps(chunk)}\n".encode("utf-8"))
+                        break
+                    if len(chunk) > 0:
+                        await response.write("".join(f"{json.dumps(model)}\n" for model in chunk).encode("utf-8"))
+            finally:
+                cancelled.set()
+
+            await response.write_eof()
+            return response
+
         @routes.get("/model-manager/model/{type}/{index}/{filename:.*}")
         async def get_model_info(request):
             """
@@ -55,7 +121,7 @@ class ModelManager:
 
             try:
                 model_path = utils.get_valid_full_path(model_type, path_index, filename)
-                result = self.get_model_info(model_path)
+                result = await thread.blocking_executor.run("model", self.get_model_info, model_path)
                 return web.json_response({"success": True, "data": result})
             except Exception as e:
                 error_msg = f"Read model info failed: {str(e)}"
@@ -86,7 +152,16 @@ class ModelManager:
                 model_path = utils.get_valid_full_path(model_type, path_index, filename)
                 if model_path is None:
                     raise RuntimeError(f"File {filename} not found")
-                self.update_model(model_path, model_data)
+
+                def update():
+                    self.update_model(model_path, model_data)
+                    self.model_watcher.notify_changed(model_type, model_path)
+                    if "type" in model_data and "pathIndex" in model_data and "fullname" in model_data:
+                        new_model_type = model_data["type"]
+                        new_model_path = utils.get_full_path(new_model_type, int(model_data["pathIndex"]), model_data["fullname"])
+                        self.model_watcher.notify_changed(new_model_type, new_model_path)
+
+                await thread.blocking_executor.run("model", update)
                 return web.json_response({"success": True})
             except Exception as e:
                 error_msg = f"Update model failed: {str(e)}"
@@ -106,91 +181,51 @@ class ModelManager:
                 model_path = utils.get_valid_full_path(model_type, path_index, filename)
                 if model_path is None:
                     raise RuntimeError(f"File {filename} not found")
-                self.remove_model(model_path)
+
+                def remove():
+                    self.remove_model(model_path)
+                    self.model_watcher.notify_changed(model_type, model_path)
+
+                await thread.blocking_executor.run("model", remove)
                 return web.json_response({"success": True})
             except Exception as e:
                 error_msg = f"Delete model failed: {str(e)}"
                 utils.print_error(error_msg)
                 return web.json_response({"success": False, "error": error_msg})
 
-    def scan_models(self, folder: str, request):
-        result = []
+    query_keys = ["subFolder", "search", "extension", "isFolder", "sort", "order", "offset", "limit"]
 
+    def scan_models(self, folder: str, request):
         include_hidden_files = utils.get_setting_value(request, "scan.include_hidden_files", False)
-        folders, *others = folder_paths.folder_names_and_paths[folder]
-
-        def get_file_info(entry: os.DirEntry[str], base_path: str, path_index: int):
-            prefix_path = utils.normalize_path(base_path)
-            if not prefix_path.endswith("/"):
-                prefix_path = f"{prefix_path}/"
-
-            is_file = entry.is_file()
-            relative_path = utils.normalize_path(entry.path).replace(prefix_path, "")
-            sub_folder = os.path.dirname(relative_path)
-            filename = os.path.basename(relative_path)
-            basename = os.path.splitext(filename)[0] if is_file else filename
-            extension = os.path.splitext(filename)[1] if is_file else ""
-
-            model_preview = None
-            if is_file:
-                preview_name = utils.get_model_preview_name(entry.path)
-                preview_ext = f".{preview_name.split('.')[-1]}"
-                model_preview = f"/model-manager/preview/{folder}/{path_index}/{relative_path.replace(extension, preview_ext)}"
-
-            if not os.path.exists(entry.path):
-                utils.print_error(f"{entry.path} is not file or directory.")
-                return None
-
-            stat = entry.stat()
-            return {
-                "type": folder,
-                "subFolder": sub_folder,
-                "isFolder": not is_file,
-                "basename": basename,
-                "extension": extension,
-                "pathIndex": path_index,
-                "sizeBytes": stat.st_size if is_file else 0,
-                "preview": model_preview,
-                "createdAt": round(stat.st_ctime_ns / 1000000),
-                "updatedAt": round(stat.st_mtime_ns / 1000000),
-            }
-
-        def get_all_files_entry(directory: str):
-            entries: list[os.DirEntry[str]] = []
-            if not os.path.exists(directory):
-                return []
-            with os.scandir(directory) as it:
-                for entry in it:
-                    if not include_hidden_files and entry.name.startswith("."):
-                        continue
-                    
-                    if entry.is_file():
-                        extension = os.path.splitext(entry.name)[1]
-                        if extension in folder_paths.supported_pt_extensions:
-                            entries.append(entry)
-                    else:
-                        entries.append(entry)
-                        entries.extend(get_all_files_entry(entry.path))
-            return entries
-
-        BATCH_SIZE = 200
-        MAX_WORKERS = min(4, os.cpu_count() or 1)
-        
-        for path_index, base_path in enumerate(folders):
-            if not os.path.exists(base_path):
-                continue
-            file_entries = get_all_files_entry(base_path)
-            
-            for i in range(0, len(file_entries), BATCH_SIZE):
-                batch = file_entries[i:i + BATCH_SIZE]
-                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-                    futures = {executor.submit(get_file_info, entry, base_path, path_index): entry for entry in batch}
-                    for future in as_completed(futures):
-                        file_info = future.result()
-                        if file_info is not None:
-                            result.append(file_info)
-
-        return result
+        self.model_watcher.start()
+
+        query = request.query
+        if not any(key in query for key in self.query_keys):
+            return self.model_watcher.get_models(folder, include_hidden_files)
+
+        # Only the index is refreshed, the query sees the current files
+        # without building the model list of the whole folder.
+        self.model_watcher.refresh(folder)
+
+        extension = query.get("extension", None)
+        offset = int(query.get("offset", 0))
+        limit = int(query["limit"]) if "limit" in query else None
+        total, models = self.model_index.query_models(
+            folder,
+            include_hidden_files=include_hidden_files,
+            include_folders=query.get("isFolder", "true") != "false",
+            sub_folder=query.get("subFolder", None),
+            search=query.get("search", None),
+            extensions=[e.strip() for e in extension.split(",") if e.strip()] if extension else None,
+            sort=query.get("sort", "name"),
+            order=query.get("order", None),
+            offset=offset,
+            limit=limit,
+        )
+
+        if limit is None:
+            return models
+        return {"total": total, "offset": offset, "limit": limit, "items": models}
 
     def get_model_info(self, model_path: str):
         directory = os.path.dirname(model_path)
@@ -0,0 +1,216 @@
+import json
+import time
+import sqlite3
+import threading
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse
+from typing import Any, Optional
+from . import utils
+from . import thread
+
+
+class HttpClient:
+    """
+    Shared HTTP client with one pooled session per host, so connections
+    (and their TLS handshakes) are kept alive and reused between requests.
+
+    Failed connections and transient server errors are retried with an
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        timeout: tuple[float, float] = (10, 60),
+    ):
+        self.pool_size = pool_size
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._sessions: dict[str, requests.Session] = {}
+
+    def _create_session(self):
+        retry = Retry(
+            total=self.retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("HEAD", "GET", "POST"),
+            respect_retry_after_header=True,
+            # Let the caller inspect the last response instead of raising MaxRetryError.
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get_session(self, url: str) -> requests.Session:
+        parsed_url = urlparse(url)
+        key = f"{parsed_url.scheme}://{parsed_url.netloc}"
+        with self._lock:
+            session = self._sessions.get(key, None)
+            if session is None:
+                session = self._create_session()
+                self._sessions[key] = session
+            return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.get_session(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+class ResponseCache:
+    """
+    On-disk cache of remote JSON responses.
+
+    Entries are fresh for a per-host TTL, stale entries are revalidated with
+    If-None-Match / If-Modified-Since when the server sent validators. The
+    cache is bounded in size and evicts the least recently used entries.
+    """
+
+    host_ttls = {
+        "civitai.com": 6 * 60 * 60,
+        "huggingface.co": 60 * 60,
+    }
+    default_ttl = 10 * 60
+
+    def __init__(self, db_path: str, max_size: int = 64 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._conn.commit()
+
+    def get_ttl(self, url: str):
+        host_name = urlparse(url).hostname or ""
+        for host, ttl in self.host_ttls.items():
+            if host_name == host or host_name.endswith(f".{host}"):
+                return ttl
+        return self.default_ttl
+
+    def _lookup(self, url: str):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+
+    def _touch(self, url: str, revalidated: bool = False):
+        now = time.time()
+        with self._lock:
+            if revalidated:
+                self._conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            else:
+                self._conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+            self._conn.commit()
+
+    def _store(self, url: str, body: bytes, etag: Optional[str], last_modified: Optional[str]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, body, etag, last_modified, stored_at, accessed_at, size) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, body, etag, last_modified, now, now, len(body)),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+        rows = self._conn.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+        for url, size in rows:
+            if total_size <= self.max_size:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+            total_size -= size
+
+    def get_json(self, url: str, headers: Optional[dict] = None, rate_limiter: Optional["thread.RateLimiter"] = None) -> Any:
+        """
+        Get the JSON response of the url, from the cache when it is fresh.
+        The rate limiter is only used when the request goes over the network.
+        """
+        entry = self._lookup(url)
+        if entry is not None:
+            body, etag, last_modified, stored_at = entry
+            if time.time() - stored_at < self.get_ttl(url):
+                self._touch(url)
+                return json.loads(body)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if etag:
+                request_headers["If-None-Match"] = etag
+            if last_modified:
+                request_headers["If-Modified-Since"] = last_modified
+
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        response = get_http_client().get(url, headers=request_headers)
+
+        if response.status_code == 304 and entry is not None:
+            utils.print_debug(f"Revalidated cached response of {url}")
+            self._touch(url, revalidated=True)
+            return json.loads(entry[0])
+
+        response.raise_for_status()
+        body = response.content
+        data = json.loads(body)
+        self._store(url, body, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return data
+
+
+_http_client: Optional[HttpClient] = None
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    global _http_client
+    with _response_cache_lock:
+        if _http_client is None:
+            _http_client = HttpClient()
+        return _http_client
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(utils.join_path(utils.get_cache_path(), "http_cache.db"))
+        return _response_cache
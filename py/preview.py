@@ -0,0 +1,382 @@
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import hashlib
+import threading
+import subprocess
+
+from typing import Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from . import utils
+from . import thread
+from . import preview_worker
+
+
+class PreviewRenderer:
+    """
+    Render the previews in worker processes, so decoding and encoding scale
+    across the cores instead of contending for the GIL.
+
+    Every thread of the pool drives its own `preview_worker` process. The
+    workers are started as plain scripts, so nothing of ComfyUI is forked or
+    imported again. Where no worker can be started, the threads render by
+    themselves.
+
+    Concurrent requests of the same rendition share one render. At most
+    `max_pending` requested renders are handed to the pool, further requests
+    wait in the event loop and are dropped when their client goes away.
+    Background renders only start while a worker is idle.
+    """
+
+    # A worker taking longer for a render (eg. hanging on a malformed image) is killed.
+    render_timeout = 60.0
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 32):
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.max_pending = max_pending
+        # Frozen applications can not run the worker script.
+        self.use_processes = not getattr(sys, "frozen", False)
+        self._cond = threading.Condition()
+        self._pending: dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._local = threading.local()
+
+    def _start_process(self):
+        return subprocess.Popen(
+            [sys.executable, preview_worker.__file__],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+        )
+
+    def _get_process(self) -> Optional[subprocess.Popen]:
+        process: Optional[subprocess.Popen] = getattr(self._local, "process", None)
+        if process is not None and process.poll() is None:
+            return process
+        if not self.use_processes:
+            return None
+        try:
+            process = self._start_process()
+        except OSError as e:
+            utils.print_warning(f"Unable to start a preview worker, rendering previews in threads: {e}")
+            self.use_processes = False
+            process = None
+        self._local.process = process
+        return process
+
+    def _render(self, source: str, max_size: int, path: str) -> int:
+        """
+        Render in the worker process of the current thread.
+        """
+        process = self._get_process()
+        if process is None:
+            return preview_worker.render_preview_file(source, max_size, path)
+
+        job = {"source": source, "max_size": max_size, "path": path}
+        # Killing the worker ends the blocking read below, select does not support pipes on Windows.
+        deadline = threading.Timer(self.render_timeout, process.kill)
+        deadline.daemon = True
+        deadline.start()
+        try:
+            process.stdin.write(f"{json.dumps(job)}\n")
+            process.stdin.flush()
+            line = process.stdout.readline()
+        except OSError:
+            line = ""
+        finally:
+            deadline.cancel()
+        if not line:
+            # The worker died (eg. crashed on a broken image) or timed out, the next render starts a new one.
+            process.kill()
+            self._local.process = None
+            raise RuntimeError(f"Preview worker exited or timed out while rendering {source}")
+
+        result = json.loads(line)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result["size"]
+
+    def _submit(self, source: str, max_size: int, path: str) -> Future:
+        with self._cond:
+            future = self._pending.get(path, None)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="ModelManagerPreview")
+            future = self._executor.submit(self._render, source, max_size, path)
+            self._pending[path] = future
+        future.add_done_callback(lambda f: self._done(path))
+        return future
+
+    def _done(self, path: str):
+        with self._cond:
+            self._pending.pop(path, None)
+            self._cond.notify_all()
+
+    async def render(self, source: str, max_size: int, path: str) -> int:
+        """
+        Render the rendition in the pool, waiting for a free slot first.
+        """
+        with self._cond:
+            future = self._pending.get(path, None)
+
+        if future is None:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_pending)
+            slots = self._slots
+            await slots.acquire()
+            try:
+                future = self._submit(source, max_size, path)
+            except:
+                slots.release()
+                raise
+            loop = asyncio.get_running_loop()
+            future.add_done_callback(lambda f: loop.call_soon_threadsafe(slots.release))
+
+        # A cancelled request must not cancel the render shared with others.
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    def render_background(self, source: str, max_size: int, path: str) -> int:
+        """
+        Wait until a worker is idle, then render the rendition in the pool.
+        """
+        with self._cond:
+            while len(self._pending) >= self.max_workers:
+                self._cond.wait()
+            future = self._submit(source, max_size, path)
+        return future.result()
+
+    def metrics(self):
+        with self._cond:
+            return {
+                "maxWorkers": self.max_workers,
+                "maxPending": self.max_pending,
+                "pending": len(self._pending),
+                "processes": self.use_processes,
+            }
+
+
+class PreviewCache:
+    """
+    Content addressed cache of the rendered previews on disk.
+
+    A rendition is keyed by the source path, its mtime and size and the
+    target size, so an edited source gets a new key and a stale rendition is
+    never served. Renditions are rendered once, lazily or by the background
+    warmer, and then served straight from disk. The least recently used
+    renditions are evicted when the cache grows over `max_size` bytes.
+
+    A rendition keeps the mtime of its source, so the validators of the
+    served file (ETag, Last-Modified) only change when the source does.
+    """
+
+    # The renditions a requested size is rounded up to, a bounded set keeps
+    # the cache small and the browser cache hits high.
+    preview_sizes = (128, 256, 512, 1024)
+    default_size = 1024
+    # Serving a rendition only refreshes its atime (used for the LRU) this often.
+    touch_interval = 60 * 60
+    # The warmer stops when the cache is this full, so that warming never
+    # evicts the renditions that were actually viewed.
+    warm_budget = 0.5
+
+    def __init__(self, cache_dir: str, max_size: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._total_size: Optional[int] = None
+        self._warm_queue: queue.Queue[tuple[str, int]] = queue.Queue()
+        self._warming: set[tuple[str, int]] = set()
+        self._warmer: Optional[threading.Thread] = None
+        self.renderer = PreviewRenderer()
+        # The warmer renders the rendition the grid requested last, nothing
+        # is warmed before the grid requested a size.
+        self.warm_size: Optional[int] = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def resolve_size(self, size: Optional[int]) -> int:
+        """
+        The smallest rendition covering the requested size.
+        """
+        if size is None:
+            return self.default_size
+        for preview_size in self.preview_sizes:
+            if preview_size >= size:
+                return preview_size
+        return self.preview_sizes[-1]
+
+    def get_key(self, source: str, max_size: int) -> str:
+        stat = os.stat(source)
+        key = f"{utils.normalize_path(source)}\0{stat.st_mtime_ns}\0{stat.st_size}\0{max_size}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def get_path(self, key: str) -> str:
+        return utils.join_path(self.cache_dir, key[:2], f"{key}.webp")
+
+    def lookup(self, source: str, max_size: int) -> Optional[str]:
+        """
+        The cached rendition of the source, None when it is not rendered yet.
+        """
+        path = self.get_path(self.get_key(source, max_size))
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if time.time() - stat.st_atime > self.touch_interval:
+            try:
+                os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+            except OSError:
+                pass
+        return path
+
+    def render(self, source: str, max_size: int) -> str:
+        """
+        Render the source into the cache unless it is already there, the
+        render waits for an idle worker.
+        """
+        path = self.lookup(source, max_size)
+        if path is not None:
+            return path
+
+        path = self.get_path(self.get_key(source, max_size))
+        size = self.renderer.render_background(source, max_size, path)
+        self._record(size)
+        return path
+
+    def _locate(self, source: str, max_size: int) -> tuple[str, bool]:
+        path = self.lookup(source, max_size)
+        if path is not None:
+            return path, True
+        return self.get_path(self.get_key(source, max_size)), False
+
+    async def get(self, source: str, max_size: int = default_size) -> str:
+        """
+        The path of the rendition, rendered by the worker pool when missing.
+        """
+        path, cached = await thread.blocking_executor.run("preview", self._locate, source, max_size)
+        if cached:
+            return path
+
+        size = await self.renderer.render(source, max_size, path)
+        await thread.blocking_executor.run("preview", self._record, size)
+        return path
+
+    def _record(self, size: int):
+        """
+        Account a new rendition, evicting old ones when the cache is full.
+        """
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._scan_size()
+            else:
+                self._total_size += size
+            if self._total_size > self.max_size:
+                self._evict()
+
+    def _has_warm_budget(self):
+        with self._lock:
+            if self._total_size is None:
+                self._total_size = self._scan_size()
+            return self._total_size < self.max_size * self.warm_budget
+
+    def warm(self, sources: list[str], max_size: Optional[int] = None):
+        """
+        Render the sources in the background, one at a time, while the
+        cache is below its warm budget.
+        """
+        max_size = max_size or self.warm_size
+        if max_size is None:
+            return
+        with self._lock:
+            for source in sources:
+                item = (source, max_size)
+                if item in self._warming:
+                    continue
+                self._warming.add(item)
+                self._warm_queue.put(item)
+
+            if self._warmer is None or not self._warmer.is_alive():
+                self._warmer = threading.Thread(target=self._warm_worker, name="ModelManagerPreview", daemon=True)
+                self._warmer.start()
+
+    def _warm_worker(self):
+        while True:
+            try:
+                item = self._warm_queue.get(timeout=10)
+            except queue.Empty:
+                with self._lock:
+                    if self._warm_queue.empty():
+                        self._warmer = None
+                        return
+                continue
+
+            if not self._has_warm_budget():
+                utils.print_debug("Preview cache is full enough, stop warming previews.")
+                with self._lock:
+                    self._warming.clear()
+                    while not self._warm_queue.empty():
+                        self._warm_queue.get_nowait()
+                continue
+
+            source, max_size = item
+            try:
+                if os.path.isfile(source):
+                    self.render(source, max_size)
+            except Exception as e:
+                utils.print_debug(f"Warm preview {source} failed: {e}")
+            finally:
+                with self._lock:
+                    self._warming.discard(item)
+
+    def _list_files(self):
+        files: list[tuple[float, int, str]] = []
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if not filename.endswith(".webp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_atime, stat.st_size, path))
+        return files
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._list_files())
+
+    def _evict(self):
+        """
+        Remove the least recently used renditions down to 80% of max_size.
+        """
+        files = sorted(self._list_files())
+        total_size = sum(size for _, size, _ in files)
+        target_size = self.max_size * 0.8
+        for _, size, path in files:
+            if total_size <= target_size:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
+        self._total_size = total_size
+
+
+_preview_cache: Optional[PreviewCache] = None
+_preview_cache_lock = threading.Lock()
+
+
+def get_preview_cache() -> PreviewCache:
+    global _preview_cache
+    with _preview_cache_lock:
+        if _preview_cache is None:
+            _preview_cache = PreviewCache(utils.join_path(utils.get_cache_path(), "previews"))
+        return _preview_cache
@@ -0,0 +1,107 @@
+"""
+Render previews in a separate process.
+
+This module only depends on PIL and must not import anything of ComfyUI or
+of the model manager, it is started as a script by `preview.PreviewRenderer`.
+Every line of stdin is a job `{"source", "max_size", "path"}`, every line of
+stdout its result `{"size"}` or `{"error"}`.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import threading
+
+from io import BytesIO
+from PIL import Image
+
+
+def render_image_preview(filename: str, max_size: int = 1024) -> bytes:
+    """
+    Encode the image as a WebP thumbnail of at most `max_size` pixels.
+    Animated images keep up to 30 frames.
+    """
+    with Image.open(filename) as img:
+        exif_data = img.info.get("exif")
+        icc_profile = img.info.get("icc_profile")
+
+        if getattr(img, "is_animated", False) and img.n_frames > 1:
+            total_frames = img.n_frames
+            step = max(1, math.ceil(total_frames / 30))
+
+            frames, durations = [], []
+
+            for frame_idx in range(0, total_frames, step):
+                img.seek(frame_idx)
+                frame = img.copy()
+                frame.thumbnail((max_size, max_size), Image.Resampling.NEAREST)
+
+                frames.append(frame)
+                durations.append(img.info.get("duration", 100) * step)
+
+            save_args = {
+                "format": "WEBP",
+                "save_all": True,
+                "append_images": frames[1:],
+                "duration": durations,
+                "loop": 0,
+                "quality": 80,
+                "method": 0,
+                "allow_mixed": False,
+            }
+
+            if exif_data:
+                save_args["exif"] = exif_data
+
+            if icc_profile:
+                save_args["icc_profile"] = icc_profile
+
+            img_byte_arr = BytesIO()
+            frames[0].save(img_byte_arr, **save_args)
+            return img_byte_arr.getvalue()
+
+        img.thumbnail((max_size, max_size), Image.Resampling.BICUBIC)
+
+        img_byte_arr = BytesIO()
+        save_args = {"format": "WEBP", "quality": 80}
+
+        if exif_data:
+            save_args["exif"] = exif_data
+        if icc_profile:
+            save_args["icc_profile"] = icc_profile
+
+        img.save(img_byte_arr, **save_args)
+        return img_byte_arr.getvalue()
+
+
+def render_preview_file(source: str, max_size: int, path: str) -> int:
+    """
+    Render the preview of the source into the path, keeping the mtime of
+    the source. Returns the size of the written file.
+    """
+    source_mtime_ns = os.stat(source).st_mtime_ns
+    data = render_image_preview(source, max_size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.utime(tmp_path, ns=(time.time_ns(), source_mtime_ns))
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def main():
+    for line in sys.stdin:
+        try:
+            job = json.loads(line)
+            result = {"size": render_preview_file(job["source"], job["max_size"], job["path"])}
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        sys.stdout.write(f"{json.dumps(result)}\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import copy
+import asyncio
+import threading
+
+from aiohttp import web
+from typing import Any
+from . import config
+
+
+class ProgressBroadcaster:
+    """
+    Coalesce the progress events sent to the frontend.
+
+    Within one interval only the latest state of every (event, key) is kept,
+    then only the fields that changed since the last sent state are sent, all
+    the updates batched in one `model_manager_progress` message. The frontend
+    restores the full payloads and dispatches them as the original events.
+
+    A message is a list of {"event", "key", "full", "data"}. Deltas always
+    carry the `key_fields` of the state. When a new client connects, or a
+    client asks for it because it has no base for a delta (eg. a reloaded
+    page reusing its client id), the full states are sent again.
+    """
+
+    key_fields = ("taskId",)
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending: dict[tuple[str, str], dict] = {}
+        self._sent: dict[tuple[str, str], dict] = {}
+        self._sids: set[str] = set()
+        self._scheduled = False
+        self._force_resync = False
+        self._finished: set[tuple[str, str]] = set()
+
+    def add_routes(self, routes):
+
+        @routes.post("/model-manager/progress/resync")
+        async def resync_progress(request):
+            """
+            Send the full progress states again with the next flush.
+            """
+            self.resync()
+            return web.json_response({"success": True})
+
+    def publish(self, event: str, key: str, data: dict[str, Any]):
+        """
+        Queue the current state of the key, callable from any thread.
+        """
+        snapshot = copy.deepcopy(data)
+        with self._lock:
+            self._pending[(event, key)] = snapshot
+            self._finished.discard((event, key))
+        self._request_flush()
+
+    def resync(self):
+        """
+        Send the full states instead of deltas with the next flush.
+        """
+        with self._lock:
+            self._force_resync = True
+        self._request_flush()
+
+    def _request_flush(self):
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        config.serverInstance.loop.call_soon_threadsafe(self._schedule_flush)
+
+    def forget(self, event: str, key: str):
+        """
+        Drop the state of a finished key, its last pending update is still
+        sent but not kept for the clients connecting later.
+        """
+        with self._lock:
+            self._sent.pop((event, key), None)
+            if (event, key) in self._pending:
+                self._finished.add((event, key))
+
+    def _schedule_flush(self):
+        loop = asyncio.get_running_loop()
+        loop.call_later(self.interval, lambda: asyncio.ensure_future(self._flush()))
+
+    async def _flush(self):
+        sids = set(getattr(config.serverInstance, "sockets", {}).keys())
+        with self._lock:
+            pending = self._pending
+            finished = self._finished
+            self._pending = {}
+            self._finished = set()
+            self._scheduled = False
+            resync = self._force_resync or not sids <= self._sids
+            self._force_resync = False
+            self._sids = sids
+
+            if resync:
+                for name, state in self._sent.items():
+                    pending.setdefault(name, state)
+
+            updates: list[dict] = []
+            for (event, key), state in pending.items():
+                sent = None if resync else self._sent.get((event, key), None)
+                delta = None if sent is None else self._diff(sent, state)
+                if delta is None:
+                    updates.append({"event": event, "key": key, "full": True, "data": state})
+                elif delta:
+                    delta = {**{name: state[name] for name in self.key_fields if name in state}, **delta}
+                    updates.append({"event": event, "key": key, "full": False, "data": delta})
+                if (event, key) in finished:
+                    self._sent.pop((event, key), None)
+                else:
+                    self._sent[(event, key)] = state
+
+        if updates:
+            await config.serverInstance.send_json("model_manager_progress", updates)
+
+    @staticmethod
+    def _diff(old: dict, new: dict):
+        """
+        The changed fields, nested dicts are compared one level deep.
+        None when a field was removed, then the full state has to be sent.
+        """
+        if not set(old) <= set(new):
+            return None
+        delta = {}
+        for name, value in new.items():
+            old_value = old.get(name, None)
+            if isinstance(value, dict) and isinstance(old_value, dict):
+                if not set(old_value) <= set(value):
+                    return None
+                changed = {k: v for k, v in value.items() if k not in old_value or old_value[k] != v}
+                if changed:
+                    delta[name] = changed
+            elif name not in old or old_value != value:
+                delta[name] = value
+        return delta
+
+
+broadcaster = ProgressBroadcaster(interval=config.progress_interval)
@@ -1,57 +1,456 @@
+import time
 import asyncio
 import threading
 import queue
+import functools
+import heapq
+import datetime
+import itertools
+import collections
+import aiohttp
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional
 
 from . import utils
 
 
-class DownloadThreadPool:
-    def __init__(self) -> None:
-        self.workers_count = 0
-        self.task_queue = queue.Queue()
-        self.running_tasks = set()
+class BlockingExecutor:
+    """
+    Run the blocking work of the request handlers (file system scans, stat,
+    PIL, moving files) off the event loop of the PromptServer.
+
+    Every endpoint has its own concurrency limit, so that a large scan cannot
+    occupy all the workers.
+    """
+
+    default_limit = 4
+
+    def __init__(self, max_workers: int = 8, limits: dict[str, int] = {}):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ModelManager")
+        self._limits = dict(limits)
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _get_semaphore(self, endpoint: str):
+        semaphore = self._semaphores.get(endpoint, None)
+        if semaphore is None:
+            limit = self._limits.get(endpoint, self.default_limit)
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[endpoint] = semaphore
+        return semaphore
+
+    async def run(self, endpoint: str, func, *args, **kwargs):
+        """
+        Run func in the executor once the endpoint has a free slot.
+        """
+        async with self._get_semaphore(endpoint):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+
+class RateLimiter:
+    """
+    Allow at most `rate` calls per second, shared by all threads.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_time - now
+            self._next_time = max(now, self._next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket of `rate` bytes per second, a rate of 0 is unlimited.
+
+    A consumer may take more tokens than available and leave the bucket in
+    debt, the next consumers wait until it is paid back. Waiting consumers
+    are served by priority, then in arrival order.
+    """
+
+    def __init__(self, rate: float = 0, burst_seconds: float = 1.0):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self._tokens = 0.0
+        self._updated_at = time.monotonic()
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def set_rate(self, rate: float):
+        if rate == self.rate:
+            return
+        self._refill()
+        self.rate = rate
+        if rate <= 0:
+            self._tokens = 0.0
+        self._schedule_wakeup(immediate=True)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            burst = self.rate * self.burst_seconds
+            self._tokens = min(burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, size: int, priority: int = 0):
+        if self.rate <= 0 and not self._waiters:
+            return
+        self._refill()
+        if not self._waiters and self._tokens >= 0:
+            self._tokens -= size
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._counter), size, future))
+        self._schedule_wakeup()
+        await future
+
+    def _schedule_wakeup(self, immediate: bool = False):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        if not self._waiters:
+            return
+        delay = 0 if immediate or self.rate <= 0 else max(0.0, -self._tokens / self.rate)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._wakeup = None
+        self._refill()
+        while self._waiters and (self.rate <= 0 or self._tokens >= 0):
+            _, _, size, future = heapq.heappop(self._waiters)
+            if future.done():
+                # The waiting download was cancelled.
+                continue
+            if self.rate > 0:
+                self._tokens -= size
+            future.set_result(None)
+        self._schedule_wakeup()
+
+
+class BandwidthScheduler:
+    """
+    Limit the bandwidth of the downloads, all of them share a global bucket
+    and every task has its own bucket for the per-task cap. Only used on the
+    download engine loop.
+
+    The global cap can be overridden for time-of-day windows, written as
+    "HH:MM-HH:MM=MB/s" and separated with commas, e.g. "09:00-18:00=2".
+    A window may wrap around midnight.
+    """
+
+    def __init__(self):
+        self.max_bandwidth = 0.0
+        self.task_bandwidth = 0.0
+        self.schedule: list[tuple[int, int, float]] = []
+        self._global_bucket = TokenBucket()
+        self._task_buckets: dict[str, TokenBucket] = {}
+
+    def configure(self, max_bandwidth: float = 0, task_bandwidth: float = 0, schedule: str = ""):
+        """
+        Bandwidths are in bytes per second, 0 is unlimited.
+        """
+        self.max_bandwidth = max(0.0, float(max_bandwidth or 0))
+        self.task_bandwidth = max(0.0, float(task_bandwidth or 0))
+        self.schedule = self.parse_schedule(schedule or "")
+
+    @staticmethod
+    def parse_schedule(schedule: str):
+        def parse_time(value: str):
+            hour, minute = value.strip().split(":")
+            return int(hour) * 60 + int(minute)
+
+        windows: list[tuple[int, int, float]] = []
+        for item in schedule.split(","):
+            if not item.strip():
+                continue
+            try:
+                period, rate = item.split("=")
+                start, end = period.split("-")
+                windows.append((parse_time(start), parse_time(end), float(rate) * 1024 * 1024))
+            except ValueError:
+                utils.print_warning(f"Invalid bandwidth schedule: {item.strip()}")
+        return windows
+
+    def get_global_rate(self, now: Optional[datetime.datetime] = None):
+        now = now or datetime.datetime.now()
+        minute = now.hour * 60 + now.minute
+        for start, end, rate in self.schedule:
+            in_window = start <= minute < end if start <= end else minute >= start or minute < end
+            if in_window:
+                return rate
+        return self.max_bandwidth
+
+    async def acquire(self, task_id: str, size: int, priority: int = 0):
+        """
+        Wait until the task may transfer `size` bytes.
+        """
+        task_bucket = self._task_buckets.get(task_id, None)
+        if task_bucket is None:
+            task_bucket = TokenBucket()
+            self._task_buckets[task_id] = task_bucket
+        task_bucket.set_rate(self.task_bandwidth)
+        self._global_bucket.set_rate(self.get_global_rate())
+
+        await task_bucket.acquire(size)
+        await self._global_bucket.acquire(size, priority)
+
+    def release(self, task_id: str):
+        self._task_buckets.pop(task_id, None)
+
+
+class DownloadEngine:
+    """
+    Run download coroutines on a dedicated event loop thread, so that any
+    number of downloads share one thread and one aiohttp connection pool.
+
+    At most `max_concurrent` tasks run at the same time, the others wait in
+    a queue and are started as soon as a slot is free, by `order_key` when
+    it is set, otherwise in FIFO order. Tasks are stopped by cancelling them.
+    """
+
+    def __init__(self, max_concurrent: int = 5):
+        self.max_concurrent = max_concurrent
         self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._completed = 0
+        self._failed = 0
+        self._pending: collections.OrderedDict[str, Callable[[str], Awaitable[Any]]] = collections.OrderedDict()
+        self._running: dict[str, Optional[asyncio.Task]] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.bandwidth = BandwidthScheduler()
+        self.order_key: Optional[Callable[[str], Any]] = None
+
+    def resize(self, max_concurrent: int):
+        """
+        Change the number of concurrent tasks, running tasks are not stopped
+        when it shrinks.
+        """
+        with self._lock:
+            self.max_concurrent = max(1, int(max_concurrent))
+            self._dispatch()
 
-        default_max_workers = 5
-        max_workers: int = default_max_workers
-        self.max_worker = max_workers
+    def _get_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            t = threading.Thread(target=self._loop.run_forever, name="ModelManagerDownload", daemon=True)
+            t.start()
+        return self._loop
 
-    def submit(self, task, task_id):
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        The client session shared by the downloads, only usable on the engine loop.
+        """
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                # The connections are already bounded by the running tasks and their
+                # segments, a per host limit would make segments wait for each other.
+                connector=aiohttp.TCPConnector(limit=0, limit_per_host=0),
+                # A download may take hours, only limit connecting and stalled reads.
+                # `connect` would also count the wait for a pooled connection.
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60),
+                trust_env=True,
+                # Let the stream buffer hold the large chunks of fast connections.
+                read_bufsize=2 * 1024 * 1024,
+            )
+        return self._session
+
+    def submit(self, task_id: str, task: Callable[[str], Awaitable[Any]]):
+        """
+        Queue the task, returns "Running", "Waiting" or "Existing".
+        """
         with self._lock:
-            if task_id in self.running_tasks:
+            if task_id in self._running or task_id in self._pending:
                 return "Existing"
-            self.running_tasks.add(task_id)
-        self.task_queue.put((task, task_id))
-        return self._adjust_worker_count()
+            self._pending[task_id] = task
+            started = self._dispatch()
+        return "Running" if task_id in started else "Waiting"
 
-    def _adjust_worker_count(self):
-        if self.workers_count < self.max_worker:
-            self._start_worker()
-            return "Running"
-        else:
-            return "Waiting"
+    def _dispatch(self):
+        started: list[str] = []
+        loop = self._get_loop()
+        while self._pending and len(self._running) < self.max_concurrent:
+            if self.order_key is None:
+                task_id = next(iter(self._pending))
+            else:
+                task_id = min(self._pending, key=self.order_key)
+            task = self._pending.pop(task_id)
+            self._running[task_id] = None
+            loop.call_soon_threadsafe(self._start, task_id, task)
+            started.append(task_id)
+        return started
 
-    def _start_worker(self):
-        t = threading.Thread(target=self._worker, daemon=True)
-        t.start()
+    def _start(self, task_id: str, task: Callable[[str], Awaitable[Any]]):
+        future = self._loop.create_task(task(task_id))
         with self._lock:
-            self.workers_count += 1
+            self._running[task_id] = future
+        future.add_done_callback(functools.partial(self._finish, task_id))
 
-    def _worker(self):
-        loop = asyncio.new_event_loop()
+    def _finish(self, task_id: str, future: asyncio.Task):
+        failed = not future.cancelled() and future.exception() is not None
+        if failed:
+            utils.print_error(f"Download task {task_id} failed: {future.exception()}")
+        with self._lock:
+            self._running.pop(task_id, None)
+            if failed:
+                self._failed += 1
+            else:
+                self._completed += 1
+            self._dispatch()
 
-        while True:
-            if self.task_queue.empty():
-                break
+    def metrics(self):
+        with self._lock:
+            return {
+                "maxWorkers": self.max_concurrent,
+                "running": len(self._running),
+                "queued": len(self._pending),
+                "completed": self._completed,
+                "failed": self._failed,
+            }
 
-            task, task_id = self.task_queue.get()
+    def is_active(self, task_id: str):
+        with self._lock:
+            return task_id in self._running or task_id in self._pending
 
-            try:
-                loop.run_until_complete(task(task_id))
-                with self._lock:
-                    self.running_tasks.remove(task_id)
-            except Exception as e:
-                utils.print_error(f"worker run error: {str(e)}")
+    async def cancel(self, task_id: str):
+        """
+        Remove a waiting task, or cancel a running task and wait until it stopped.
+        """
+        with self._lock:
+            if self._pending.pop(task_id, None) is not None:
+                return
+            if task_id not in self._running:
+                return
+            loop = self._loop
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._cancel(task_id), loop))
 
+    async def _cancel(self, task_id: str):
+        # Runs after _start, the loop handles the callbacks in order.
         with self._lock:
-            self.workers_count -= 1
+            future = self._running.get(task_id, None)
+        if future is None:
+            return
+        future.cancel()
+        await asyncio.wait([future])
+
+
+blocking_executor = BlockingExecutor(limits={"models": 2, "preview": 4, "hash": 1})
+
+
+class TaskExecutor:
+    """
+    Bounded executor of async tasks keyed by id. Every worker thread runs
+    its own event loop and keeps taking tasks until it is idle for
+    `idle_timeout` seconds, so a burst of tasks does not start a thread per
+    task. A task id can only be queued once at a time.
+    """
+
+    def __init__(self, max_workers: int = 5, idle_timeout: float = 60.0, name: str = "ModelManagerTask"):
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self._queue: queue.Queue[tuple[Callable[[str], Awaitable[Any]], str]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._task_ids: set[str] = set()
+        self._workers = 0
+        self._idle_workers = 0
+        # Counted under the lock, a task taken from the queue is queued until it is running.
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+
+    def submit(self, task: Callable[[str], Awaitable[Any]], task_id: str):
+        """
+        Queue the task, returns "Running", "Waiting" or "Existing".
+        """
+        with self._lock:
+            if task_id in self._task_ids:
+                return "Existing"
+            self._task_ids.add(task_id)
+            self._queue.put((task, task_id))
+            self._queued += 1
+            status = "Running" if self._running + self._queued <= self.max_workers else "Waiting"
+            self._start_workers()
+        return status
+
+    def resize(self, max_workers: int):
+        """
+        Change the number of workers, extra workers exit after their current task.
+        """
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            self._start_workers()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "maxWorkers": self.max_workers,
+                "workers": self._workers,
+                "idleWorkers": self._idle_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+
+    def _start_workers(self):
+        while self._workers < self.max_workers and self._idle_workers < self._queued:
+            self._workers += 1
+            # Counted as idle until it takes a task, so one task does not start two workers.
+            self._idle_workers += 1
+            t = threading.Thread(target=self._worker, name=f"{self.name}-{self._workers}", daemon=True)
+            t.start()
+
+    def _worker(self):
+        loop = asyncio.new_event_loop()
+        try:
+            while True:
+                try:
+                    task, task_id = self._queue.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    with self._lock:
+                        # A task may have been queued right after the timeout.
+                        if not self._queue.empty():
+                            continue
+                        self._idle_workers -= 1
+                        self._workers -= 1
+                        return
+
+                with self._lock:
+                    self._idle_workers -= 1
+                    self._queued -= 1
+                    self._running += 1
+
+                failed = False
+                try:
+                    loop.run_until_complete(task(task_id))
+                except Exception as e:
+                    failed = True
+                    utils.print_error(f"{self.name} task {task_id} failed: {e}")
+                finally:
+                    with self._lock:
+                        self._running -= 1
+                        self._task_ids.discard(task_id)
+                        if failed:
+                            self._failed += 1
+                        else:
+                            self._completed += 1
+
+                        if self._workers > self.max_workers:
+                            # Shrunk while running.
+                            self._workers -= 1
+                            return
+                        self._idle_workers += 1
+        finally:
+            loop.close()
@@ -6,6 +6,7 @@ import folder_paths
 from aiohttp import web
 
 from . import utils
+from . import progress
 
 
 class ModelUploader:
@@ -70,10 +71,12 @@ class ModelUploader:
                             update_upload_progress = {
                                 "uploaded_size": uploaded_size,
                             }
-                            await utils.send_json("update_upload_progress", update_upload_progress)
+                            progress.broadcaster.publish("update_upload_progress", "upload", update_upload_progress)
+                            last_update_time = time.time()
 
         update_upload_progress = {
             "uploaded_size": uploaded_size,
         }
-        await utils.send_json("update_upload_progress", update_upload_progress)
+        progress.broadcaster.publish("update_upload_progress", "upload", update_upload_progress)
+        progress.broadcaster.forget("update_upload_progress", "upload")
         os.rename(tmp_filepath, filepath)
@@ -1,5 +1,7 @@
 import os
+import sys
 import json
+import asyncio
 import yaml
 import shutil
 import tarfile
@@ -16,6 +18,7 @@ import folder_paths
 from aiohttp import web
 from typing import Any, Optional
 from . import config
+from . import network
 
 # Media file extensions
 VIDEO_EXTENSIONS = ['.mp4', '.webm', '.mov', '.avi', '.mkv', '.flv', '.wmv', '.m4v', '.ogv']
@@ -127,7 +130,7 @@ def download_web_distribution(version: str):
         print_info(f"current version {version}, web version {web_version}")
         print_info("Downloading web distribution...")
         download_url = f"https://github.com/hayden-fr/ComfyUI-Model-Manager/releases/download/v{version}/dist.tar.gz"
-        response = requests.get(download_url, stream=True)
+        response = network.get_http_client().get(download_url, stream=True)
         response.raise_for_status()
 
         temp_file = join_path(config.extension_uri, "temp.tar.gz")
@@ -183,6 +186,19 @@ def resolve_file_content_type(filename: str):
     return content_type
 
 
+def is_subpath(path: str, base_path: str) -> bool:
+    """
+    Whether the path is the base path or inside of it, after resolving `..`.
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    base_path = os.path.normcase(os.path.abspath(base_path))
+    try:
+        return os.path.commonpath([path, base_path]) == base_path
+    except ValueError:
+        # On different drives.
+        return False
+
+
 def get_full_path(model_type: str, path_index: int, filename: str):
     """
     Get the absolute path in the model type through string concatenation.
@@ -217,6 +233,13 @@ def get_download_path():
     return download_path
 
 
+def get_cache_path():
+    cache_path = join_path(config.extension_uri, "cache")
+    if not os.path.exists(cache_path):
+        os.makedirs(cache_path)
+    return cache_path
+
+
 def recursive_search_files(directory: str, request):
     if not os.path.isdir(directory):
         return []
@@ -248,6 +271,32 @@ def search_files(directory: str):
     return files
 
 
+def get_sidecar_key(name: str) -> str:
+    """
+    The file name as compared by the file system, Windows and macOS match
+    `model.PNG` for `model.png`.
+    """
+    if sys.platform in ("win32", "darwin"):
+        return name.lower()
+    return name
+
+
+def get_directory_sidecars(files: list[str]) -> dict[str, list[str]]:
+    """
+    Group the files of a single directory listing by basename, so that the
+    previews and descriptions of every model can be resolved without probing.
+    The preview variant `name.preview.ext` is also grouped under `name`.
+    The basenames are keyed by `get_sidecar_key`.
+    """
+    sidecars: dict[str, list[str]] = {}
+    for file in files:
+        basename = get_sidecar_key(os.path.splitext(file)[0])
+        sidecars.setdefault(basename, []).append(file)
+        if basename.endswith(".preview"):
+            sidecars.setdefault(basename[: -len(".preview")], []).append(file)
+    return sidecars
+
+
 def file_list_to_name_dict(files: list[str]):
     file_dict: dict[str, str] = {}
     for file in files:
@@ -300,22 +349,32 @@ def get_model_all_previews(model_path: str) -> list[str]:
     return _check_preview_variants(base_dirname, basename, PREVIEW_EXTENSIONS)
 
 
-def get_model_preview_name(model_path: str) -> str:
-    """Get the first available preview file or 'no-preview.png' if none found"""
+def get_model_preview_name(model_path: str, sidecars: Optional[dict[str, list[str]]] = None) -> str:
+    """
+    Get the first available preview file or 'no-preview.png' if none found.
+    When the sidecars of the directory are given, no file system access is needed.
+    """
     base_dirname = os.path.dirname(model_path)
     basename = os.path.splitext(os.path.basename(model_path))[0]
-    
+
+    if sidecars is not None:
+        # The name is returned as listed, eg. `model.PNG` for `model.png`.
+        candidates = {get_sidecar_key(name): name for name in sidecars.get(get_sidecar_key(basename), [])}
+        find_preview = lambda name: candidates.get(get_sidecar_key(name), None)
+    else:
+        find_preview = lambda name: name if os.path.isfile(join_path(base_dirname, name)) else None
+
     for ext in PREVIEW_EXTENSIONS:
         # Check direct match first
-        preview_name = f"{basename}{ext}"
-        if os.path.isfile(join_path(base_dirname, preview_name)):
+        preview_name = find_preview(f"{basename}{ext}")
+        if preview_name:
             return preview_name
-        
+
         # Check preview variant
-        preview_name = f"{basename}.preview{ext}"
-        if os.path.isfile(join_path(base_dirname, preview_name)):
+        preview_name = find_preview(f"{basename}.preview{ext}")
+        if preview_name:
             return preview_name
-    
+
     return "no-preview.png"
 
 
@@ -343,7 +402,7 @@ def save_model_preview(model_path: str, file_or_url: Any, platform: Optional[str
         url = file_or_url
 
         try:
-            response = requests.get(url)
+            response = network.get_http_client().get(url)
             response.raise_for_status()
             
             # Determine content type from response headers or URL extension
@@ -412,22 +471,24 @@ def _get_extension_from_content_type(content_type: str) -> Optional[str]:
     return VIDEO_CONTENT_TYPE_MAP.get(content_type.lower())
 
 
-def get_model_all_descriptions(model_path: str):
-    base_dirname = os.path.dirname(model_path)
-    files = search_files(base_dirname)
+def get_model_all_descriptions(model_path: str, sidecars: Optional[dict[str, list[str]]] = None):
+    basename = os.path.splitext(os.path.basename(model_path))[0]
+    if sidecars is not None:
+        files = sidecars.get(get_sidecar_key(basename), [])
+    else:
+        files = search_files(os.path.dirname(model_path))
     files = folder_paths.filter_files_extensions(files, [".txt", ".md"])
 
-    basename = os.path.splitext(os.path.basename(model_path))[0]
     output: list[str] = []
     for file in files:
         file_basename = os.path.splitext(file)[0]
-        if file_basename == basename:
+        if get_sidecar_key(file_basename) == get_sidecar_key(basename):
             output.append(file)
     return output
 
 
-def get_model_description_name(model_path: str):
-    descriptions = get_model_all_descriptions(model_path)
+def get_model_description_name(model_path: str, sidecars: Optional[dict[str, list[str]]] = None):
+    descriptions = get_model_all_descriptions(model_path, sidecars)
     basename = os.path.splitext(os.path.basename(model_path))[0]
     return descriptions[0] if len(descriptions) > 0 else f"{basename}.md"
 
@@ -529,7 +590,13 @@ def get_setting_value(request: web.Request, key: str, default: Any = None) -> An
 
 
 async def send_json(event: str, data: Any, sid: str = None):
-    await config.serverInstance.send_json(event, data, sid)
+    server_loop = config.serverInstance.loop
+    if asyncio.get_running_loop() is server_loop:
+        await config.serverInstance.send_json(event, data, sid)
+    else:
+        # Sent from a worker loop, the websockets belong to the server loop.
+        coro = config.serverInstance.send_json(event, data, sid)
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, server_loop))
 
 
 import sys
@@ -559,12 +626,15 @@ def pip_install(package_name: str):
 import hashlib
 
 
-def calculate_sha256(path, buffer_size=1024 * 1024):
+def calculate_sha256(path, buffer_size=4 * 1024 * 1024):
     sha256 = hashlib.sha256()
-    with open(path, "rb") as f:
+    # Read into one reused buffer instead of allocating a new bytes object per chunk.
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
         while True:
-            data = f.read(buffer_size)
-            if not data:
+            size = f.readinto(buffer)
+            if not size:
                 break
-            sha256.update(data)
+            sha256.update(view[:size])
     return sha256.hexdigest()
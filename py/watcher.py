@@ -0,0 +1,295 @@
+import os
+import time
+import asyncio
+import threading
+
+from typing import Optional
+from . import config
+from . import utils
+from . import index
+from . import preview
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "ModelWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        for path in filter(None, paths):
+            path = utils.normalize_path(os.fsdecode(path))
+            self.watcher.mark_dirty(os.path.dirname(path))
+            if event.is_directory:
+                self.watcher.mark_dirty(path)
+
+
+class ModelWatcher:
+    """
+    Keep an in-memory model table of the loaded model folders in sync with the
+    file system and broadcast the changes to the frontend.
+
+    Uses watchdog when it is installed, otherwise falls back to polling the
+    model index, which only costs one stat per directory. Only the models of
+    the directories the index rescanned are diffed against the table.
+    """
+
+    debounce_interval = 1.0
+    # Network mounts do not emit events for remote changes, so the loaded
+    # folders are also resynced periodically when watchdog is used.
+    poll_interval = 5.0
+    observer_poll_interval = 60.0
+
+    def __init__(self, model_index: index.ModelIndex):
+        self.model_index = model_index
+        self.observer = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+        # folder -> path -> (hidden, model)
+        self._tables: dict[str, dict[str, tuple[bool, dict]]] = {}
+        # folder -> dirty directories
+        self._dirty: dict[str, set[str]] = {}
+        self._base_paths: dict[str, list[str]] = {}
+        self._watched_paths: set[str] = set()
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+
+        if Observer is not None:
+            self.observer = Observer()
+            self.observer.daemon = True
+            self.observer.start()
+        else:
+            utils.print_debug("watchdog is not installed, polling model directories instead.")
+        self._update_base_paths()
+
+        t = threading.Thread(target=self._worker, daemon=True)
+        t.start()
+
+    def _update_base_paths(self):
+        """
+        Pick up the model paths added since the last call, they are watched
+        from then on.
+        """
+        base_paths = utils.resolve_model_base_paths()
+        with self._lock:
+            self._base_paths = base_paths
+
+        if self.observer is None:
+            return
+        for paths in base_paths.values():
+            for base_path in paths:
+                if base_path in self._watched_paths or not os.path.isdir(base_path):
+                    continue
+                self._watched_paths.add(base_path)
+                try:
+                    self.observer.schedule(_ChangeHandler(self), base_path, recursive=True)
+                    utils.print_debug(f"Watching model directory {base_path}")
+                except Exception as e:
+                    utils.print_warning(f"Unable to watch {base_path}: {e}")
+
+    def mark_dirty(self, directory: str):
+        with self._lock:
+            for folder, base_paths in self._base_paths.items():
+                for base_path in base_paths:
+                    if directory == base_path or directory.startswith(f"{base_path}/"):
+                        self._dirty.setdefault(folder, set()).add(directory)
+        self._wakeup.set()
+
+    def load(self, folder: str):
+        """
+        Load the folder into the in-memory table on first access, from then
+        on the folder and its model index are kept in sync.
+        """
+        with self._lock:
+            table = self._tables.get(folder, None)
+
+        if table is None:
+            table = self._load_table(folder)
+            with self._lock:
+                self._tables[folder] = table
+
+        return table
+
+    def sync(self, folder: str):
+        """
+        Bring a loaded folder up to date right away, for explicit listing
+        requests. File system events do not cover changes made on network
+        mounts by other machines.
+        """
+        with self._lock:
+            loaded = folder in self._tables
+        if loaded:
+            self._sync_folder(folder)
+        return self.load(folder)
+
+    def refresh(self, folder: str):
+        """
+        Bring the model index of the folder up to date, for queries answered
+        by the index. The changes are broadcast by the worker.
+        """
+        self.model_index.refresh(folder)
+        if self.model_index.has_changes(folder):
+            self._wakeup.set()
+
+    def get_models(self, folder: str, include_hidden_files: bool = False):
+        """
+        Return the model list of the folder from the synced in-memory table.
+        """
+        table = self.sync(folder)
+        return [model for hidden, model in table.values() if include_hidden_files or not hidden]
+
+    def iter_models(self, folder: str, include_hidden_files: bool = False):
+        """
+        Yield the model list of the folder in chunks. A folder that is not
+        loaded yet is streamed while it is scanned and loaded afterwards.
+        """
+        with self._lock:
+            loaded = folder in self._tables
+
+        if loaded:
+            table = self.sync(folder)
+            models = [model for hidden, model in table.values() if include_hidden_files or not hidden]
+            for i in range(0, len(models), self.model_index.scan_chunk_size):
+                yield models[i : i + self.model_index.scan_chunk_size]
+            return
+
+        table = {}
+        for records in self.model_index.iter_records(folder):
+            table.update((path, (hidden, model)) for path, hidden, model in records)
+            yield [model for path, hidden, model in records if include_hidden_files or not hidden]
+
+        with self._lock:
+            self._tables.setdefault(folder, table)
+
+    def _load_table(self, folder: str):
+        records = self.model_index.get_records(folder)
+        return {path: (hidden, model) for path, hidden, model in records}
+
+    def _worker(self):
+        while True:
+            timeout = self.poll_interval if self.observer is None else self.observer_poll_interval
+            notified = self._wakeup.wait(timeout)
+            # Wait for a while to collect the events of a batch operation.
+            time.sleep(self.debounce_interval)
+            self._wakeup.clear()
+
+            try:
+                self._update_base_paths()
+            except Exception as e:
+                utils.print_error(f"Update model paths failed: {e}")
+
+            with self._lock:
+                dirty = self._dirty
+                self._dirty = {}
+                folders = list(self._tables.keys())
+
+            for folder, directories in dirty.items():
+                for directory in directories:
+                    # The directory mtime does not change when a file is modified in place.
+                    self.model_index.invalidate(folder, directory)
+
+            if self.observer is not None and notified:
+                folders = [folder for folder in folders if folder in dirty or self.model_index.has_changes(folder)]
+
+            for folder in folders:
+                try:
+                    self._sync_folder(folder)
+                except Exception as e:
+                    utils.print_error(f"Sync models of {folder} failed: {e}")
+
+    def notify_changed(self, folder: str, *paths: str):
+        """
+        Apply changes made by the model manager itself right away,
+        without waiting for the file system events.
+        """
+        for path in paths:
+            self.model_index.invalidate(folder, os.path.dirname(path))
+        with self._lock:
+            loaded = folder in self._tables
+        if loaded:
+            self._sync_folder(folder)
+
+    def _sync_folder(self, folder: str):
+        with self._sync_lock:
+            self.model_index.refresh(folder)
+            directories = self.model_index.take_changes(folder)
+            if not directories:
+                return
+            records = self.model_index.get_directory_records(folder, directories)
+
+            with self._lock:
+                old_table = self._tables.get(folder, None)
+                if old_table is None:
+                    return
+                # Readers iterate the table outside of the lock, it is replaced instead of updated.
+                table = dict(old_table)
+                old_entries = {path: entry for path, entry in old_table.items() if os.path.dirname(path) in directories}
+                for path in old_entries:
+                    del table[path]
+                new_entries = {path: (hidden, model) for path, hidden, model in records}
+                table.update(new_entries)
+                self._tables[folder] = table
+
+        visible_changes = self._diff(old_entries, new_entries, include_hidden_files=False)
+        all_changes = self._diff(old_entries, new_entries, include_hidden_files=True)
+        if not any(all_changes):
+            return
+
+        created, updated, deleted = visible_changes
+        utils.print_debug(f"Models of {folder} changed: +{len(created)} ~{len(updated)} -{len(deleted)}")
+        delta = {
+            "folder": folder,
+            "created": created,
+            "updated": updated,
+            "deleted": deleted,
+        }
+        # The changes for the clients that also list the hidden files.
+        delta["withHidden"] = dict(zip(("created", "updated", "deleted"), all_changes))
+        coro = utils.send_json("update_models", delta)
+        asyncio.run_coroutine_threadsafe(coro, config.serverInstance.loop)
+
+    def _diff(self, old_entries: dict, new_entries: dict, include_hidden_files: bool):
+        """
+        The created, updated and deleted models between two sets of table entries.
+        """
+        visible = lambda entry: entry is not None and (include_hidden_files or not entry[0])
+        created, updated, deleted = [], [], []
+        for path, entry in new_entries.items():
+            if not visible(entry):
+                continue
+            old = old_entries.get(path, None)
+            if not visible(old):
+                created.append(entry[1])
+            elif old[1] != entry[1]:
+                updated.append(entry[1])
+        for path, entry in old_entries.items():
+            if visible(entry) and not visible(new_entries.get(path, None)):
+                deleted.append(entry[1])
+        return created, updated, deleted
+
+
+_model_watcher: Optional[ModelWatcher] = None
+_model_watcher_lock = threading.Lock()
+
+
+def get_model_watcher() -> ModelWatcher:
+    global _model_watcher
+    with _model_watcher_lock:
+        if _model_watcher is None:
+            index_file = utils.join_path(utils.get_cache_path(), "model_index.db")
+            model_index = index.ModelIndex(index_file, on_previews=preview.get_preview_cache().warm)
+            _model_watcher = ModelWatcher(model_index)
+        return _model_watcher
@@ -45,6 +45,17 @@ export const useConfig = defineStore('config', (store) => {
     }
   })
 
+  // Renditions the server renders previews at, see `PreviewCache.preview_sizes`.
+  const previewSizes = [128, 256, 512, 1024]
+  const previewSize = computed(() => {
+    const { width, height } = cardSize.value
+    const pixels = Math.max(width, height) * (window.devicePixelRatio || 1)
+    return (
+      previewSizes.find((size) => size >= pixels) ??
+      previewSizes[previewSizes.length - 1]
+    )
+  })
+
   const config = {
     isMobile,
     gutter: 16,
@@ -52,6 +63,7 @@ export const useConfig = defineStore('config', (store) => {
     cardSizeMap: cardSizeMap,
     cardSizeFlag: cardSizeFlag,
     cardSize: cardSize,
+    previewSize: previewSize,
     cardWidth: 240,
     aspect: 7 / 9,
     dialog: {
@@ -249,5 +261,58 @@ function useAddConfigSettings(store: import('hooks/store').StoreProvider) {
       defaultValue: false,
       type: 'boolean',
     })
+
+    app.ui?.settings.addSetting({
+      id: 'ModelManager.Scan.ApiConcurrency',
+      category: [t('modelManager'), t('setting.scan'), 'ApiConcurrency'],
+      name: t('setting.scanApiConcurrency'),
+      defaultValue: 4,
+      type: 'number',
+      attrs: { min: 1, max: 16, step: 1 },
+    })
+
+    app.ui?.settings.addSetting({
+      id: 'ModelManager.Scan.ApiRateLimit',
+      category: [t('modelManager'), t('setting.scan'), 'ApiRateLimit'],
+      name: t('setting.scanApiRateLimit'),
+      defaultValue: 2,
+      type: 'number',
+      attrs: { min: 0, step: 0.5 },
+    })
+
+    app.ui?.settings.addSetting({
+      id: 'ModelManager.Download.MaxTaskCount',
+      category: [t('modelManager'), t('setting.download'), 'MaxTaskCount'],
+      name: t('setting.downloadMaxTaskCount'),
+      defaultValue: 5,
+      type: 'number',
+      attrs: { min: 1, max: 32, step: 1 },
+    })
+
+    app.ui?.settings.addSetting({
+      id: 'ModelManager.Download.MaxBandwidth',
+      category: [t('modelManager'), t('setting.download'), 'MaxBandwidth'],
+      name: t('setting.downloadMaxBandwidth'),
+      defaultValue: 0,
+      type: 'number',
+      attrs: { min: 0, step: 0.5 },
+    })
+
+    app.ui?.settings.addSetting({
+      id: 'ModelManager.Download.TaskBandwidth',
+      category: [t('modelManager'), t('setting.download'), 'TaskBandwidth'],
+      name: t('setting.downloadTaskBandwidth'),
+      defaultValue: 0,
+      type: 'number',
+      attrs: { min: 0, step: 0.5 },
+    })
+
+    app.ui?.settings.addSetting({
+      id: 'ModelManager.Download.BandwidthSchedule',
+      category: [t('modelManager'), t('setting.download'), 'BandwidthSchedule'],
+      name: t('setting.downloadBandwidthSchedule'),
+      defaultValue: undefined,
+      type: 'text',
+    })
   })
 }
@@ -55,6 +55,14 @@ export const useDownload = defineStore('download', (store) => {
           }),
         )()
       },
+      moveTask: (action) => {
+        wrapperToastError(async () =>
+          request(`/download/${item.taskId}/order`, {
+            method: 'PUT',
+            body: JSON.stringify({ action }),
+          }),
+        )()
+      },
       deleteTask: () => {
         confirm.require({
           message: t('deleteAsk', [t('downloadTask').toLowerCase()]),
@@ -115,7 +123,17 @@ export const useDownload = defineStore('download', (store) => {
 
     api.addEventListener('create_download_task', (event) => {
       const item = event.detail as DownloadTaskOptions
-      taskList.value.unshift(createTaskItem(item))
+      taskList.value.push(createTaskItem(item))
+    })
+
+    api.addEventListener('update_download_queue', (event) => {
+      const order = event.detail as string[]
+      const index = new Map(order.map((taskId, i) => [taskId, i]))
+      taskList.value = [...taskList.value].sort(
+        (a, b) =>
+          (index.get(a.taskId) ?? order.length) -
+          (index.get(b.taskId) ?? order.length),
+      )
     })
 
     api.addEventListener('update_download_task', (event) => {
@@ -152,7 +170,6 @@ export const useDownload = defineStore('download', (store) => {
         detail: `${task?.fullname} Download completed`,
         life: 2000,
       })
-      store.models.refresh()
     })
   })
 
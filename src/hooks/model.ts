@@ -1,7 +1,7 @@
 import DialogModelDetail from 'components/DialogModelDetail.vue'
 import { useLoading } from 'hooks/loading'
 import { useMarkdown } from 'hooks/markdown'
-import { request } from 'hooks/request'
+import { request, requestStream } from 'hooks/request'
 import { defineStore } from 'hooks/store'
 import { useToast } from 'hooks/toast'
 import { castArray, cloneDeep } from 'lodash'
@@ -67,10 +67,24 @@ export const useModels = defineStore('models', (store) => {
 
   const refreshModels = async (folder: string) => {
     loading.show(folder)
-    return request(`/models/${folder}`)
-      .then((resData) => {
-        models.value[folder] = resData
-        return resData
+    // The whole folder is loaded: the explorer tree and the `update_models`
+    // deltas work on the full model lists, the paged query parameters of
+    // `/models/{folder}` are only used by API clients.
+    // The models are shown chunk by chunk while the folder is scanned, the
+    // previous list is kept until the first chunk arrives.
+    let loaded: Model[] | undefined
+    return requestStream<Model>(`/models/${folder}/stream`, (items) => {
+      if (!loaded) {
+        models.value[folder] = []
+        loaded = models.value[folder]
+      }
+      loaded.push(...items)
+    })
+      .then(() => {
+        if (!loaded) {
+          models.value[folder] = []
+        }
+        return models.value[folder]
       })
       .finally(() => {
         loading.hide(folder)
@@ -162,8 +176,6 @@ export const useModels = defineStore('models', (store) => {
     if (oldKey) {
       store.dialog.close({ key: oldKey })
     }
-
-    refreshModels(data.type)
   }
 
   const deleteModel = async (model: BaseModel) => {
@@ -195,9 +207,6 @@ export const useModels = defineStore('models', (store) => {
                 life: 2000,
               })
               store.dialog.close({ key: dialogKey })
-              return refreshModels(model.type)
-            })
-            .then(() => {
               resolve(void 0)
             })
             .catch((e) => {
@@ -236,10 +245,46 @@ export const useModels = defineStore('models', (store) => {
     return [prefixPath, fullname].filter(Boolean).join('/')
   }
 
+  type ModelChangeLists = {
+    created: Model[]
+    updated: Model[]
+    deleted: Model[]
+  }
+
+  type ModelChanges = ModelChangeLists & {
+    folder: string
+    // The changes including the hidden files.
+    withHidden?: ModelChangeLists
+  }
+
+  const applyModelChanges = (event: ModelChanges) => {
+    const folderModels = models.value[event.folder]
+    if (!folderModels) {
+      return
+    }
+    const includeHidden = app.ui?.settings.getSettingValue<boolean>(
+      'ModelManager.Scan.IncludeHiddenFiles',
+    )
+    const changes = (includeHidden && event.withHidden) || event
+    // Created models are upserted, the model may already be in the list.
+    const staleKeys = new Set(
+      [...changes.created, ...changes.updated, ...changes.deleted].map(
+        genModelKey,
+      ),
+    )
+    models.value[event.folder] = folderModels
+      .filter((model) => !staleKeys.has(genModelKey(model)))
+      .concat(changes.updated, changes.created)
+  }
+
   onMounted(() => {
     api.getSystemStats().then((res) => {
       systemStat.value = res
     })
+
+    api.addEventListener('update_models', (event) => {
+      applyModelChanges(event.detail as ModelChanges)
+    })
   })
 
   return {
@@ -0,0 +1,133 @@
+import { api } from 'scripts/comfyAPI'
+import { withPreviewSize } from 'utils/media'
+import { Ref, ref, watch } from 'vue'
+
+interface BatchPreview {
+  preview: string
+  data?: string
+  error?: string
+}
+
+interface Resolver {
+  resolve: (data: string) => void
+  reject: (error: Error) => void
+}
+
+// Only the small thumbnails are batched, the larger renditions are requested
+// one by one so the browser can cache and revalidate them.
+const maxBatchedSize = 256
+const maxBatchLength = 200
+const maxLoadedPreviews = 1000
+
+const loaded = new Map<string, Promise<string>>()
+const queued = new Map<number, Map<string, Resolver>>()
+let scheduled = false
+
+const readBatch = async (size: number, batch: Map<string, Resolver>) => {
+  try {
+    const response = await api.fetchApi('/model-manager/preview/batch', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ previews: [...batch.keys()], size }),
+    })
+    const reader = response
+      .body!.pipeThrough(new TextDecoderStream())
+      .getReader()
+
+    let buffer = ''
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) {
+        break
+      }
+      const lines = (buffer + value).split('\n')
+      buffer = lines.pop() ?? ''
+      for (const line of lines.filter(Boolean)) {
+        const item = JSON.parse(line) as BatchPreview
+        const resolver = batch.get(item.preview)
+        batch.delete(item.preview)
+        if (item.data) {
+          resolver?.resolve(item.data)
+        } else {
+          resolver?.reject(new Error(item.error))
+        }
+      }
+    }
+  } finally {
+    for (const resolver of batch.values()) {
+      resolver.reject(new Error('Preview is missing in the batch'))
+    }
+  }
+}
+
+const flushBatches = () => {
+  scheduled = false
+  for (const [size, batch] of queued) {
+    readBatch(size, batch).catch(() => {})
+  }
+  queued.clear()
+}
+
+const loadBatchedPreview = (preview: string, size: number) => {
+  const key = withPreviewSize(preview, size)
+  let promise = loaded.get(key)
+  if (promise) {
+    return promise
+  }
+
+  promise = new Promise<string>((resolve, reject) => {
+    const batch = queued.get(size) ?? new Map<string, Resolver>()
+    queued.set(size, batch)
+    batch.set(preview, { resolve, reject })
+
+    if (batch.size >= maxBatchLength) {
+      queued.delete(size)
+      readBatch(size, batch).catch(() => {})
+    } else if (!scheduled) {
+      scheduled = true
+      setTimeout(flushBatches)
+    }
+  })
+  promise.catch(() => loaded.delete(key))
+
+  loaded.set(key, promise)
+  if (loaded.size > maxLoadedPreviews) {
+    loaded.delete(loaded.keys().next().value!)
+  }
+  return promise
+}
+
+/**
+ * The image source of a model card preview. The small thumbnails of the
+ * cards rendered together are loaded with one batch request, falling back to
+ * the preview URL when the batch has no rendition for it.
+ */
+export const useBatchedPreview = (
+  preview: Ref<string | undefined>,
+  size: Ref<number>,
+) => {
+  const src = ref<string>()
+
+  watch(
+    [preview, size],
+    ([url, previewSize]) => {
+      const previewUrl = withPreviewSize(url ?? '', previewSize)
+      if (!url || previewUrl === url || previewSize > maxBatchedSize) {
+        src.value = previewUrl || url
+        return
+      }
+
+      src.value = undefined
+      loadBatchedPreview(url, previewSize)
+        .catch(() => previewUrl)
+        .then((data) => {
+          if (preview.value === url && size.value === previewSize) {
+            src.value = data
+          }
+        })
+    },
+    { immediate: true },
+  )
+
+  return src
+}
@@ -0,0 +1,65 @@
+import { request } from 'hooks/request'
+import { api } from 'scripts/comfyAPI'
+
+interface ProgressUpdate {
+  event: string
+  key: string
+  full: boolean
+  data: Record<string, any>
+}
+
+const isPlainObject = (value: unknown): value is Record<string, any> => {
+  return typeof value === 'object' && value !== null && !Array.isArray(value)
+}
+
+const mergeState = (
+  state: Record<string, any>,
+  delta: Record<string, any>,
+) => {
+  const merged = { ...state }
+  for (const [name, value] of Object.entries(delta)) {
+    merged[name] =
+      isPlainObject(value) && isPlainObject(state[name])
+        ? { ...state[name], ...value }
+        : value
+  }
+  return merged
+}
+
+/**
+ * The server coalesces the progress events and only sends the changed
+ * fields. Restore the full payloads and dispatch them as the original events.
+ * A delta without a known base (eg. after a page reload) is dropped and the
+ * full states are requested again.
+ */
+export const useProgressEvents = () => {
+  const states = new Map<string, Record<string, any>>()
+  let resyncing = false
+
+  const resync = () => {
+    if (resyncing) {
+      return
+    }
+    resyncing = true
+    request('/progress/resync', { method: 'POST' })
+      .catch(() => {})
+      .finally(() => (resyncing = false))
+  }
+
+  api.addEventListener('reconnected', resync)
+
+  api.addEventListener('model_manager_progress', (event) => {
+    const updates = event.detail as ProgressUpdate[]
+    for (const update of updates) {
+      const id = `${update.event}:${update.key}`
+      const base = states.get(id)
+      if (!update.full && !base) {
+        resync()
+        continue
+      }
+      const state = update.full ? update.data : mergeState(base!, update.data)
+      states.set(id, state)
+      api.dispatchEvent(new CustomEvent(update.event, { detail: { ...state } }))
+    }
+  })
+}
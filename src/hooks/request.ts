@@ -14,6 +14,40 @@ export const request = async (url: string, options?: RequestInit) => {
     })
 }
 
+/**
+ * Request a newline delimited JSON endpoint, `onItems` receives the items
+ * of every chunk as soon as it arrives. An `{ "error" }` line rejects.
+ */
+export const requestStream = async <T>(
+  url: string,
+  onItems: (items: T[]) => void,
+  options?: RequestInit,
+) => {
+  const response = await api.fetchApi(`/model-manager${url}`, options)
+  if (!response.ok || !response.body) {
+    throw new Error(`${response.status} ${response.statusText}`)
+  }
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    const lines = (buffer + (value ?? '')).split('\n')
+    buffer = done ? '' : (lines.pop() ?? '')
+    const items = lines.filter(Boolean).map((line) => JSON.parse(line))
+    const error = items.find((item) => item && item.error !== undefined)
+    if (error) {
+      throw new Error(error.error)
+    }
+    if (items.length > 0) {
+      onItems(items)
+    }
+    if (done) {
+      break
+    }
+  }
+}
+
 export interface RequestOptions<T> {
   method?: RequestInit['method']
   headers?: RequestInit['headers']
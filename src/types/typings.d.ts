@@ -72,6 +72,7 @@ export interface DownloadTaskOptions {
   totalSize: number
   bps: number
   error?: string
+  priority?: number
 }
 
 export interface DownloadTask
@@ -83,6 +84,7 @@ export interface DownloadTask
   downloadSpeed: string
   pauseTask: () => void
   resumeTask: () => void
+  moveTask: (action: 'up' | 'down' | 'pin') => void
   deleteTask: () => void
 }
 
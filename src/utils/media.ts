@@ -51,3 +51,16 @@ export const isVideoUrl = (url: string, localContentType?: string): boolean => {
   // Check for specific video hosting patterns
   return VIDEO_HOST_PATTERNS.some((pattern) => urlLower.includes(pattern))
 }
+
+/**
+ * Request a smaller rendition of a local model preview
+ * @param url - The preview URL
+ * @param size - The rendition size in pixels
+ */
+export const withPreviewSize = (url: string, size: number): string => {
+  if (!url || !url.startsWith('/model-manager/preview/') || isVideoUrl(url)) {
+    return url
+  }
+  const separator = url.includes('?') ? '&' : '?'
+  return `${url}${separator}size=${size}`
+}